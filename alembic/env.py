@@ -0,0 +1,56 @@
+from logging.config import fileConfig
+import re
+from sqlalchemy import engine_from_config, pool
+from alembic import context
+from app.core.config import settings
+from app.models.models import Base
+
+config = context.config
+config.set_main_option("sqlalchemy.url", settings.DATABASE_URL)
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Monthly partitions of events and notifications are managed by archive_tasks, not by models
+PARTITION_NAME = re.compile(r"^(events|notifications)_(p\d{6}|default)$")
+
+def include_name(name, type_, parent_names) -> bool:
+    return not (type_ == "table" and PARTITION_NAME.match(name))
+
+def run_migrations_offline() -> None:
+    """Emit migration SQL to stdout without connecting to the database"""
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online() -> None:
+    connectable = engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            # SQLite can only alter tables by copying them
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,134 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Databases created earlier through Base.metadata.create_all already match this
+revision: run `alembic stamp 0001` on them before `alembic upgrade head`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Enum types are shared between tables, so on Postgres they are created once up front
+ENUMS = {
+    'notificationtype': ('EMAIL', 'SMS', 'PUSH', 'WEBHOOK'),
+    'notificationstatus': ('PENDING', 'PROCESSING', 'SENT', 'FAILED', 'RETRYING'),
+    'eventtype': ('USER_SIGNUP', 'ORDER_PLACED', 'PAYMENT_SUCCESS', 'PAYMENT_FAILED',
+                  'USER_LOGIN', 'PASSWORD_RESET', 'CUSTOM'),
+}
+
+
+def enum(name: str) -> sa.Enum:
+    return sa.Enum(*ENUMS[name], name=name).with_variant(
+        postgresql.ENUM(*ENUMS[name], name=name, create_type=False), 'postgresql'
+    )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for name, values in ENUMS.items():
+            postgresql.ENUM(*values, name=name).create(bind, checkfirst=True)
+
+    op.create_table('events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_type', enum('eventtype'), nullable=False),
+    sa.Column('user_id', sa.String(length=255), nullable=True),
+    sa.Column('event_data', sa.JSON(), nullable=False),
+    sa.Column('processed', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_events_id', 'events', ['id'], unique=False)
+
+    op.create_table('notification_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('notification_type', enum('notificationtype'), nullable=False),
+    sa.Column('total_sent', sa.Integer(), nullable=True),
+    sa.Column('total_failed', sa.Integer(), nullable=True),
+    sa.Column('total_retries', sa.Integer(), nullable=True),
+    sa.Column('avg_delivery_time', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_stats_id', 'notification_stats', ['id'], unique=False)
+
+    op.create_table('notification_templates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('notification_type', enum('notificationtype'), nullable=False),
+    sa.Column('subject', sa.String(length=500), nullable=True),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('variables', sa.JSON(), nullable=True),
+    sa.Column('version', sa.Integer(), server_default='1', nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_templates_id', 'notification_templates', ['id'], unique=False)
+
+    op.create_table('notification_rules',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('event_type', enum('eventtype'), nullable=False),
+    sa.Column('notification_type', enum('notificationtype'), nullable=False),
+    sa.Column('template_id', sa.Integer(), nullable=True),
+    sa.Column('conditions', sa.JSON(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('priority', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['template_id'], ['notification_templates.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_rules_id', 'notification_rules', ['id'], unique=False)
+
+    op.create_table('notifications',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rule_id', sa.Integer(), nullable=True),
+    sa.Column('recipient', sa.String(length=255), nullable=False),
+    sa.Column('notification_type', enum('notificationtype'), nullable=False),
+    sa.Column('subject', sa.String(length=500), nullable=True),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('status', enum('notificationstatus'), nullable=True),
+    sa.Column('retry_count', sa.Integer(), nullable=True),
+    sa.Column('max_retries', sa.Integer(), nullable=True),
+    sa.Column('scheduled_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('error_message', sa.Text(), nullable=True),
+    sa.Column('metadata', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['rule_id'], ['notification_rules.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notifications_id', 'notifications', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_id', table_name='notifications')
+    op.drop_table('notifications')
+    op.drop_index('ix_notification_rules_id', table_name='notification_rules')
+    op.drop_table('notification_rules')
+    op.drop_index('ix_notification_templates_id', table_name='notification_templates')
+    op.drop_table('notification_templates')
+    op.drop_index('ix_notification_stats_id', table_name='notification_stats')
+    op.drop_table('notification_stats')
+    op.drop_index('ix_events_id', table_name='events')
+    op.drop_table('events')
+
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        for name in ENUMS:
+            postgresql.ENUM(name=name).drop(bind, checkfirst=True)
@@ -0,0 +1,45 @@
+"""hot query indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+Composite and partial indexes for the sweeper, batch claim, analytics and rule
+lookups. On Postgres they are built CONCURRENTLY so large tables stay writable.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ('ix_notification_rules_event_type_active', 'notification_rules', ['event_type', 'is_active', 'priority'], None),
+    ('ix_notifications_pending_scheduled_at', 'notifications', ['status', 'scheduled_at'], "status = 'PENDING'"),
+    ('ix_notifications_retrying_retry_count', 'notifications', ['status', 'retry_count'], "status = 'RETRYING'"),
+    ('ix_notifications_created_at_status_type', 'notifications', ['created_at', 'status', 'notification_type'], None),
+]
+
+
+def upgrade() -> None:
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=concurrently
+            )
+
+
+def downgrade() -> None:
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=concurrently)
@@ -0,0 +1,62 @@
+"""hourly stats rollup
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+Adds notification_hourly_stats. On Postgres it is backfilled from existing
+notifications, bucketed by creation hour.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    notification_type = sa.Enum('EMAIL', 'SMS', 'PUSH', 'WEBHOOK', name='notificationtype').with_variant(
+        postgresql.ENUM(name='notificationtype', create_type=False), 'postgresql'
+    )
+    op.create_table('notification_hourly_stats',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('notification_type', notification_type, nullable=False),
+    sa.Column('total_created', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('total_sent', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('total_failed', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('total_retries', sa.Integer(), server_default='0', nullable=False),
+    sa.Column('delivery_time_total', sa.Float(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('hour', 'notification_type', name='uq_notification_hourly_stats_hour_type')
+    )
+    op.create_index('ix_notification_hourly_stats_id', 'notification_hourly_stats', ['id'], unique=False)
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            INSERT INTO notification_hourly_stats
+                (hour, notification_type, total_created, total_sent, total_failed, total_retries, delivery_time_total)
+            SELECT
+                date_trunc('hour', created_at AT TIME ZONE 'UTC'),
+                notification_type,
+                count(*),
+                count(*) FILTER (WHERE status = 'SENT'),
+                count(*) FILTER (WHERE status = 'FAILED'),
+                coalesce(sum(retry_count), 0),
+                coalesce(sum(extract(epoch FROM sent_at - created_at)) FILTER (WHERE status = 'SENT'), 0)
+            FROM notifications
+            WHERE created_at IS NOT NULL
+            GROUP BY 1, 2
+        """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notification_hourly_stats_id', table_name='notification_hourly_stats')
+    op.drop_table('notification_hourly_stats')
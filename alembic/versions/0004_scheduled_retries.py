@@ -0,0 +1,52 @@
+"""scheduled retries
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+Adds notifications.next_attempt_at and replaces the retry sweeper index with one
+on (status, next_attempt_at) for RETRYING rows. Rows already RETRYING are made
+due immediately so the release job picks them up.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.add_column(sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE notifications SET next_attempt_at = CURRENT_TIMESTAMP WHERE status = 'RETRYING'")
+
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_notifications_retrying_retry_count', table_name='notifications',
+                      postgresql_concurrently=concurrently)
+        op.create_index(
+            'ix_notifications_retrying_next_attempt_at', 'notifications', ['status', 'next_attempt_at'],
+            unique=False, postgresql_where=sa.text("status = 'RETRYING'"),
+            postgresql_concurrently=concurrently
+        )
+
+
+def downgrade() -> None:
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_notifications_retrying_next_attempt_at', table_name='notifications',
+                      postgresql_concurrently=concurrently)
+        op.create_index(
+            'ix_notifications_retrying_retry_count', 'notifications', ['status', 'retry_count'],
+            unique=False, postgresql_where=sa.text("status = 'RETRYING'"),
+            postgresql_concurrently=concurrently
+        )
+
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.drop_column('next_attempt_at')
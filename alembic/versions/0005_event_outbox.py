@@ -0,0 +1,45 @@
+"""event outbox
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+Adds event_outbox, written in the same transaction as each event and drained
+by the outbox relay. Events that were never processed are queued into it.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('event_outbox',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('published_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_event_outbox_unpublished', 'event_outbox', ['published_at', 'id'], unique=False,
+                    postgresql_where=sa.text('published_at IS NULL'))
+    op.create_index('ix_event_outbox_published_at', 'event_outbox', ['published_at'], unique=False)
+
+    op.execute("""
+        INSERT INTO event_outbox (event_id)
+        SELECT id FROM events WHERE processed IS NOT TRUE ORDER BY id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_event_outbox_published_at', table_name='event_outbox')
+    op.drop_index('ix_event_outbox_unpublished', table_name='event_outbox')
+    op.drop_table('event_outbox')
@@ -0,0 +1,45 @@
+"""notification dedup key
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+Adds notifications.event_id and a unique index on (event_id, rule_id, recipient),
+so redelivered events cannot create duplicate notifications. Existing rows keep a
+NULL event_id and are not constrained.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.add_column(sa.Column('event_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('notifications_event_id_fkey', 'events', ['event_id'], ['id'])
+
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'uq_notifications_event_rule_recipient', 'notifications', ['event_id', 'rule_id', 'recipient'],
+            unique=True, postgresql_concurrently=concurrently
+        )
+
+
+def downgrade() -> None:
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.drop_index('uq_notifications_event_rule_recipient', table_name='notifications',
+                      postgresql_concurrently=concurrently)
+
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.drop_constraint('notifications_event_id_fkey', type_='foreignkey')
+        batch_op.drop_column('event_id')
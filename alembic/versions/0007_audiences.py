@@ -0,0 +1,48 @@
+"""audiences
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+
+Adds audiences and audience_members for one-event-to-many-recipients fan-out.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('audiences',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_index('ix_audiences_id', 'audiences', ['id'], unique=False)
+    op.create_table('audience_members',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('audience_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.String(length=255), nullable=True),
+    sa.Column('attributes', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['audience_id'], ['audiences.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_audience_members_audience_id_id', 'audience_members', ['audience_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_audience_members_audience_id_id', table_name='audience_members')
+    op.drop_table('audience_members')
+    op.drop_index('ix_audiences_id', table_name='audiences')
+    op.drop_table('audiences')
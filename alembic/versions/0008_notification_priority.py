@@ -0,0 +1,34 @@
+"""notification priority
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+
+Adds notifications.priority, the delivery lane a notification is dispatched on.
+Existing rows are NORMAL.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+notification_priority = sa.Enum('HIGH', 'NORMAL', 'BULK', name='notificationpriority')
+
+
+def upgrade() -> None:
+    notification_priority.create(op.get_bind(), checkfirst=True)
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.add_column(sa.Column('priority', notification_priority, server_default='NORMAL', nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.drop_column('priority')
+    notification_priority.drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,56 @@
+"""notification digests
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18
+
+Adds per-rule coalescing settings and digest_items, the buffer of events waiting
+to be merged into one digest notification per recipient.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('notification_rules') as batch_op:
+        batch_op.add_column(sa.Column('coalesce_window_seconds', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('coalesce_max_count', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('digest_template_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            'notification_rules_digest_template_id_fkey', 'notification_templates', ['digest_template_id'], ['id']
+        )
+    op.create_table('digest_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rule_id', sa.Integer(), nullable=False),
+    sa.Column('event_id', sa.Integer(), nullable=False),
+    sa.Column('recipient', sa.String(length=255), nullable=False),
+    sa.Column('context', sa.JSON(), nullable=False),
+    sa.Column('buffered_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['event_id'], ['events.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['rule_id'], ['notification_rules.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_digest_items_rule_recipient_id', 'digest_items', ['rule_id', 'recipient', 'id'], unique=False)
+    op.create_index(
+        'uq_digest_items_event_rule_recipient', 'digest_items', ['event_id', 'rule_id', 'recipient'], unique=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('uq_digest_items_event_rule_recipient', table_name='digest_items')
+    op.drop_index('ix_digest_items_rule_recipient_id', table_name='digest_items')
+    op.drop_table('digest_items')
+    with op.batch_alter_table('notification_rules') as batch_op:
+        batch_op.drop_constraint('notification_rules_digest_template_id_fkey', type_='foreignkey')
+        batch_op.drop_column('digest_template_id')
+        batch_op.drop_column('coalesce_max_count')
+        batch_op.drop_column('coalesce_window_seconds')
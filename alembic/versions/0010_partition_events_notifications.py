@@ -0,0 +1,163 @@
+"""partition events and notifications
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-18
+
+On PostgreSQL, rebuilds events and notifications as tables partitioned by month on
+created_at, with partitions from the oldest row to PARTITION_PREMAKE_MONTHS ahead plus a
+DEFAULT partition. Unique keys of a partitioned table must contain the partition key, so
+the primary keys become (id, created_at), the notification dedup key gains created_at,
+and the foreign keys to events.id are dropped. Other databases keep plain tables and only
+get the matching key changes.
+"""
+from typing import Sequence, Union
+from datetime import datetime, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PARTITION_PREMAKE_MONTHS = 3
+
+# Matches PostgreSQL's default names, so the same names work on every database
+FK_NAMING = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+EVENT_FOREIGN_KEYS = [
+    ('notifications', 'notifications_event_id_fkey', None),
+    ('event_outbox', 'event_outbox_event_id_fkey', 'CASCADE'),
+    ('digest_items', 'digest_items_event_id_fkey', 'CASCADE'),
+]
+
+TABLE_INDEXES = {
+    'events': [
+        "CREATE INDEX ix_events_id ON events (id)",
+    ],
+    'notifications': [
+        "CREATE INDEX ix_notifications_id ON notifications (id)",
+        "CREATE INDEX ix_notifications_pending_scheduled_at ON notifications (status, scheduled_at) "
+        "WHERE status = 'PENDING'",
+        "CREATE INDEX ix_notifications_retrying_next_attempt_at ON notifications (status, next_attempt_at) "
+        "WHERE status = 'RETRYING'",
+        "CREATE INDEX ix_notifications_created_at_status_type ON notifications (created_at, status, notification_type)",
+        "ALTER TABLE notifications ADD CONSTRAINT notifications_rule_id_fkey "
+        "FOREIGN KEY (rule_id) REFERENCES notification_rules (id)",
+    ],
+}
+
+DEDUP_COLUMNS = ['event_id', 'rule_id', 'recipient']
+
+
+def _month(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1)
+
+
+def _add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _partition(table: str, unique_indexes: Sequence[str]) -> None:
+    bind = op.get_bind()
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+    op.execute(
+        f"CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)"
+    )
+
+    oldest = bind.execute(sa.text(f"SELECT min(created_at) FROM {table}_unpartitioned")).scalar()
+    current = _month(datetime.now(timezone.utc))
+    month = _month(oldest) if oldest is not None else current
+    while month <= _add_months(current, PARTITION_PREMAKE_MONTHS):
+        following = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE {table}_p{month:%Y%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{following:%Y-%m-%d} 00:00:00+00')"
+        )
+        month = following
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_unpartitioned")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute(f"DROP TABLE {table}_unpartitioned")
+
+    op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id, created_at)")
+    for statement in [*TABLE_INDEXES[table], *unique_indexes]:
+        op.execute(statement)
+
+
+def _unpartition(table: str, unique_indexes: Sequence[str]) -> None:
+    op.execute(f"ALTER TABLE {table} RENAME TO {table}_partitioned")
+    op.execute(f"CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS)")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {table}_partitioned")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    # Drops the attached partitions with it
+    op.execute(f"DROP TABLE {table}_partitioned")
+
+    op.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at DROP NOT NULL")
+    for statement in [*TABLE_INDEXES[table], *unique_indexes]:
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    for table, name, _ in EVENT_FOREIGN_KEYS:
+        with op.batch_alter_table(table, naming_convention=FK_NAMING) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+
+    for table in ('events', 'notifications'):
+        op.execute(f"UPDATE {table} SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+
+    if op.get_bind().dialect.name == 'postgresql':
+        _partition('events', [])
+        _partition('notifications', [
+            "CREATE UNIQUE INDEX uq_notifications_event_rule_recipient "
+            "ON notifications (event_id, rule_id, recipient, created_at)"
+        ])
+        return
+
+    for table in ('events', 'notifications'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(
+                'created_at', existing_type=sa.DateTime(timezone=True),
+                existing_server_default=sa.func.now(), nullable=False
+            )
+    op.drop_index('uq_notifications_event_rule_recipient', table_name='notifications')
+    op.create_index(
+        'uq_notifications_event_rule_recipient', 'notifications', [*DEDUP_COLUMNS, 'created_at'], unique=True
+    )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        _unpartition('notifications', [
+            "CREATE UNIQUE INDEX uq_notifications_event_rule_recipient "
+            "ON notifications (event_id, rule_id, recipient)"
+        ])
+        _unpartition('events', [])
+        # NOT VALID: rows whose events were archived would fail the check
+        for table, name, ondelete in EVENT_FOREIGN_KEYS:
+            op.execute(
+                f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY (event_id) REFERENCES events (id)"
+                f"{f' ON DELETE {ondelete}' if ondelete else ''} NOT VALID"
+            )
+        return
+
+    op.drop_index('uq_notifications_event_rule_recipient', table_name='notifications')
+    op.create_index('uq_notifications_event_rule_recipient', 'notifications', DEDUP_COLUMNS, unique=True)
+    for table in ('notifications', 'events'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column(
+                'created_at', existing_type=sa.DateTime(timezone=True),
+                existing_server_default=sa.func.now(), nullable=True
+            )
+    for table, name, ondelete in EVENT_FOREIGN_KEYS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_foreign_key(name, 'events', ['event_id'], ['id'], ondelete=ondelete)
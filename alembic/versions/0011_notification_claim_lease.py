@@ -0,0 +1,39 @@
+"""notification claim lease
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18
+
+Adds notifications.claimed_at and an index on (status, claimed_at) for PROCESSING
+rows, so claims whose worker died can be found and requeued. Rows already
+PROCESSING start their lease now.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.add_column(sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute("UPDATE notifications SET claimed_at = CURRENT_TIMESTAMP WHERE status = 'PROCESSING'")
+
+    # Not CONCURRENTLY: notifications is a partitioned table on PostgreSQL (revision 0010)
+    op.create_index(
+        'ix_notifications_processing_claimed_at', 'notifications', ['status', 'claimed_at'],
+        unique=False, postgresql_where=sa.text("status = 'PROCESSING'")
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_processing_claimed_at', table_name='notifications')
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.drop_column('claimed_at')
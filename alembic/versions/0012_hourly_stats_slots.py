@@ -0,0 +1,62 @@
+"""hourly stats counter slots
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-18
+
+Adds notification_hourly_stats.slot and makes it part of the unique key, so the
+counters of an hour and channel are spread over several rows and concurrent
+transactions rarely lock the same one. Existing rows become slot 0.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('notification_hourly_stats') as batch_op:
+        batch_op.add_column(sa.Column('slot', sa.Integer(), server_default='0', nullable=False))
+        batch_op.drop_constraint('uq_notification_hourly_stats_hour_type', type_='unique')
+        batch_op.create_unique_constraint(
+            'uq_notification_hourly_stats_hour_type_slot', ['hour', 'notification_type', 'slot']
+        )
+
+
+def downgrade() -> None:
+    # Fold each hour and channel's slots into its first row before the key loses the column
+    op.execute("""
+        UPDATE notification_hourly_stats SET
+            total_created = totals.total_created,
+            total_sent = totals.total_sent,
+            total_failed = totals.total_failed,
+            total_retries = totals.total_retries,
+            delivery_time_total = totals.delivery_time_total
+        FROM (
+            SELECT MIN(id) AS id,
+                   SUM(total_created) AS total_created, SUM(total_sent) AS total_sent,
+                   SUM(total_failed) AS total_failed, SUM(total_retries) AS total_retries,
+                   SUM(delivery_time_total) AS delivery_time_total
+            FROM notification_hourly_stats
+            GROUP BY hour, notification_type
+        ) AS totals
+        WHERE notification_hourly_stats.id = totals.id
+    """)
+    op.execute("""
+        DELETE FROM notification_hourly_stats WHERE id NOT IN (
+            SELECT MIN(id) FROM notification_hourly_stats GROUP BY hour, notification_type
+        )
+    """)
+    with op.batch_alter_table('notification_hourly_stats') as batch_op:
+        batch_op.drop_constraint('uq_notification_hourly_stats_hour_type_slot', type_='unique')
+        batch_op.create_unique_constraint(
+            'uq_notification_hourly_stats_hour_type', ['hour', 'notification_type']
+        )
+        batch_op.drop_column('slot')
@@ -0,0 +1,30 @@
+"""notification sweep time
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-18
+
+Adds notifications.swept_at, set when the pending sweeper queues a row again, so a
+row waiting behind a lane's backlog is not queued again on every sweep.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0013'
+down_revision: Union[str, None] = '0012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.add_column(sa.Column('swept_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('notifications') as batch_op:
+        batch_op.drop_column('swept_at')
@@ -0,0 +1,48 @@
+from typing import Optional, Sequence, Any
+from fastapi import HTTPException, Response
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
+import base64
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"id:{last_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        prefix, _, value = base64.urlsafe_b64decode(padded.encode()).decode().partition(":")
+        if prefix != "id":
+            raise ValueError(cursor)
+        return int(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def keyset_page(
+    db: AsyncSession,
+    query: Select,
+    id_column: Any,
+    response: Response,
+    cursor: Optional[str],
+    limit: int,
+    skip: int = 0
+) -> Sequence[Any]:
+    """
+    Return one page ordered by id, continuing after `cursor`.
+    The cursor for the following page is sent in the X-Next-Cursor header and is
+    absent on the last page. `skip` is the legacy offset and only applies without a cursor.
+    """
+    query = query.order_by(id_column)
+    if cursor:
+        query = query.where(id_column > decode_cursor(cursor))
+    elif skip:
+        query = query.offset(skip)
+
+    # One extra row tells whether another page exists without a count query
+    rows = (await db.execute(query.limit(limit + 1))).scalars().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(rows[-1].id)
+    return rows
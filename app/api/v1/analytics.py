@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from sqlalchemy import func
-from app.db.database import get_db
-from app.models.models import Notification, NotificationStatus, NotificationType
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, select
+from app.db.database import get_async_db
+from app.models.models import NotificationHourlyStats
 from app.schemas.notification import DashboardStats
 from datetime import datetime, timedelta
 from typing import Dict, Any
@@ -10,60 +10,75 @@ from typing import Dict, Any
 router = APIRouter()
 
 @router.get("/dashboard", response_model=DashboardStats)
-async def get_dashboard_stats(db: Session = Depends(get_db)):
-    """Get dashboard statistics"""
-    today = datetime.utcnow().date()
+async def get_dashboard_stats(db: AsyncSession = Depends(get_async_db)):
+    """Get dashboard statistics from the hourly rollups"""
+    day_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    day_end = day_start + timedelta(days=1)
     
-    # Total notifications today
-    total_today = db.query(Notification).filter(
-        func.date(Notification.created_at) == today
-    ).count()
+    rows = (await db.execute(select(NotificationHourlyStats).where(
+        NotificationHourlyStats.hour >= day_start,
+        NotificationHourlyStats.hour < day_end
+    ).order_by(NotificationHourlyStats.hour))).scalars().all()
     
-    # Sent today
-    sent_today = db.query(Notification).filter(
-        func.date(Notification.created_at) == today,
-        Notification.status == NotificationStatus.SENT
-    ).count()
-    
-    # Failed today
-    failed_today = db.query(Notification).filter(
-        func.date(Notification.created_at) == today,
-        Notification.status == NotificationStatus.FAILED
-    ).count()
+    total_today = sum(row.total_created for row in rows)
+    sent_today = sum(row.total_sent for row in rows)
+    failed_today = sum(row.total_failed for row in rows)
+    delivery_time_total = sum(row.delivery_time_total for row in rows)
     
     # Success rate
     success_rate = (sent_today / total_today * 100) if total_today > 0 else 0
+    avg_delivery_time = (delivery_time_total / sent_today) if sent_today > 0 else 0.0
     
     # Notifications by type
-    type_stats = db.query(
-        Notification.notification_type,
-        func.count(Notification.id)
-    ).filter(
-        func.date(Notification.created_at) == today
-    ).group_by(Notification.notification_type).all()
+    notifications_by_type: Dict[str, int] = {}
+    hourly: Dict[datetime, Dict[str, Any]] = {}
+    for row in rows:
+        type_key = str(row.notification_type)
+        notifications_by_type[type_key] = notifications_by_type.get(type_key, 0) + row.total_created
+        
+        hour = hourly.setdefault(row.hour, {
+            "hour": row.hour.isoformat(),
+            "total": 0,
+            "sent": 0,
+            "failed": 0,
+            "retries": 0,
+            "delivery_time_total": 0.0
+        })
+        hour["total"] += row.total_created
+        hour["sent"] += row.total_sent
+        hour["failed"] += row.total_failed
+        hour["retries"] += row.total_retries
+        hour["delivery_time_total"] += row.delivery_time_total
     
-    notifications_by_type = {str(type_): count for type_, count in type_stats}
+    hourly_stats = []
+    for hour in hourly.values():
+        delivery_time = hour.pop("delivery_time_total")
+        hour["avg_delivery_time"] = round(delivery_time / hour["sent"], 3) if hour["sent"] > 0 else 0.0
+        hourly_stats.append(hour)
     
     return DashboardStats(
         total_notifications_today=total_today,
         total_sent_today=sent_today,
         total_failed_today=failed_today,
         success_rate=round(success_rate, 2),
-        avg_delivery_time=0.0,  # Calculate if needed
+        avg_delivery_time=round(avg_delivery_time, 3),
         notifications_by_type=notifications_by_type,
-        hourly_stats=[]  # Add hourly breakdown if needed
+        hourly_stats=hourly_stats
     )
 
 @router.get("/stats/summary")
-async def get_summary_stats(db: Session = Depends(get_db)):
-    """Get summary statistics"""
-    total_notifications = db.query(Notification).count()
-    total_sent = db.query(Notification).filter(Notification.status == NotificationStatus.SENT).count()
-    total_failed = db.query(Notification).filter(Notification.status == NotificationStatus.FAILED).count()
+async def get_summary_stats(db: AsyncSession = Depends(get_async_db)):
+    """Get summary statistics from the hourly rollups"""
+    totals = (await db.execute(select(
+        func.coalesce(func.sum(NotificationHourlyStats.total_created), 0),
+        func.coalesce(func.sum(NotificationHourlyStats.total_sent), 0),
+        func.coalesce(func.sum(NotificationHourlyStats.total_failed), 0)
+    ))).one()
+    total_notifications, total_sent, total_failed = totals
     
     return {
         "total_notifications": total_notifications,
         "total_sent": total_sent,
         "total_failed": total_failed,
         "success_rate": round((total_sent / total_notifications * 100) if total_notifications > 0 else 0, 2)
-    }
\ No newline at end of file
+    }
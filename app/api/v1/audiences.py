@@ -0,0 +1,84 @@
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, select
+from typing import List, Optional
+from app.api.pagination import keyset_page, MAX_PAGE_SIZE
+from app.core.config import settings
+from app.db.database import get_async_db
+from app.schemas.notification import (
+    AudienceCreate, AudienceResponse, AudienceMemberCreate, AudienceMemberResponse, AudienceMembersAdded
+)
+from app.models.models import Audience, AudienceMember
+
+router = APIRouter()
+
+@router.post("/", response_model=AudienceResponse)
+async def create_audience(audience: AudienceCreate, db: AsyncSession = Depends(get_async_db)):
+    """Create a new audience; events fan out to its members with `audience_id` in their event data"""
+    db_audience = Audience(**audience.dict())
+    db.add(db_audience)
+    await db.commit()
+    await db.refresh(db_audience)
+    return db_audience
+
+@router.get("/", response_model=List[AudienceResponse])
+async def get_audiences(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get audiences page by page; follow the X-Next-Cursor header for the next page"""
+    audiences = await keyset_page(db, select(Audience), Audience.id, response, cursor, limit)
+    return audiences
+
+@router.get("/{audience_id}", response_model=AudienceResponse)
+async def get_audience(audience_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Get specific audience"""
+    audience = await db.get(Audience, audience_id)
+    if not audience:
+        raise HTTPException(status_code=404, detail="Audience not found")
+    return audience
+
+@router.delete("/{audience_id}")
+async def delete_audience(audience_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Delete an audience and its members"""
+    audience = await db.get(Audience, audience_id)
+    if not audience:
+        raise HTTPException(status_code=404, detail="Audience not found")
+    
+    await db.delete(audience)
+    await db.commit()
+    return {"message": "Audience deleted successfully"}
+
+@router.post("/{audience_id}/members", response_model=AudienceMembersAdded)
+async def add_audience_members(
+    audience_id: int,
+    members: List[AudienceMemberCreate],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Add members with multi-row inserts of EVENT_INGEST_CHUNK_SIZE rows"""
+    if not await db.get(Audience, audience_id):
+        raise HTTPException(status_code=404, detail="Audience not found")
+    
+    rows = [
+        {"audience_id": audience_id, "user_id": member.user_id, "attributes": member.attributes}
+        for member in members
+    ]
+    for start in range(0, len(rows), settings.EVENT_INGEST_CHUNK_SIZE):
+        await db.execute(insert(AudienceMember), rows[start:start + settings.EVENT_INGEST_CHUNK_SIZE])
+    await db.commit()
+    return AudienceMembersAdded(added=len(rows))
+
+@router.get("/{audience_id}/members", response_model=List[AudienceMemberResponse])
+async def get_audience_members(
+    audience_id: int,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get an audience's members page by page; follow the X-Next-Cursor header for the next page"""
+    query = select(AudienceMember).where(AudienceMember.audience_id == audience_id)
+    members = await keyset_page(db, query, AudienceMember.id, response, cursor, limit)
+    return members
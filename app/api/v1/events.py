@@ -1,48 +1,172 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from sqlalchemy.orm import Session
-from typing import List
-from app.db.database import get_db
-from app.schemas.notification import EventCreate, EventResponse
-from app.models.models import Event
-from app.workers.event_tasks import process_event
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import insert, select
+from pydantic import ValidationError
+from typing import List, Any, Tuple, AsyncIterator, Optional
+from datetime import datetime
+from app.api.pagination import keyset_page, MAX_PAGE_SIZE
+from app.core.config import settings
+from app.core.metrics import EVENTS_RECEIVED, STAGE_SECONDS, timed
+from app.db.database import get_async_db
+from app.schemas.notification import EventCreate, EventResponse, EventBatchItemResult, EventBatchResponse
+from app.models.models import Event, EventOutbox
+import json
 
 router = APIRouter()
 
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl", "application/ndjson")
+
 @router.post("/", response_model=EventResponse)
 async def create_event(
     event: EventCreate,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create and process a new event"""
     try:
-        # Create event
-        db_event = Event(
-            event_type=event.event_type,
-            user_id=event.user_id,
-            event_data=event.event_data
-        )
-        db.add(db_event)
-        db.commit()
-        db.refresh(db_event)
-        
-        # Process event asynchronously
-        background_tasks.add_task(process_event.delay, db_event.id)
+        with timed(STAGE_SECONDS, stage="ingest", event_type=event.event_type.value):
+            # Create event
+            db_event = Event(
+                event_type=event.event_type,
+                user_id=event.user_id,
+                event_data=event.event_data
+            )
+            db.add(db_event)
+            await db.flush()
+            
+            # Queued for processing by the outbox relay once this transaction commits
+            db.add(EventOutbox(event_id=db_event.id))
+            await db.commit()
+            await db.refresh(db_event)
         
+        EVENTS_RECEIVED.labels(event_type=event.event_type.value).inc()
         return db_event
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors()
+    )
+
+async def _ndjson_items(request: Request) -> AsyncIterator[Any]:
+    """Yield one decoded value (or the decode error) per non-blank NDJSON line"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    yield e
+    if buffer.strip():
+        try:
+            yield json.loads(buffer)
+        except ValueError as e:
+            yield e
+
+async def _json_items(request: Request) -> AsyncIterator[Any]:
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Request body is not valid JSON")
+    if not isinstance(payload, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of events")
+    for item in payload:
+        yield item
+
+async def _insert_chunk(
+    db: AsyncSession,
+    chunk: List[Tuple[int, EventCreate]],
+    results: List[EventBatchItemResult]
+):
+    """Insert a chunk of validated events and their outbox rows with one multi-row INSERT each"""
+    rows = [
+        {"event_type": event.event_type, "user_id": event.user_id, "event_data": event.event_data, "processed": False}
+        for _, event in chunk
+    ]
+    try:
+        event_ids = (await db.execute(
+            insert(Event).returning(Event.id, sort_by_parameter_order=True),
+            rows
+        )).scalars().all()
+        await db.execute(insert(EventOutbox), [{"event_id": event_id} for event_id in event_ids])
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        results.extend(EventBatchItemResult(index=index, error=str(e)) for index, _ in chunk)
+        return
+
+    results.extend(
+        EventBatchItemResult(index=index, id=event_id) for (index, _), event_id in zip(chunk, event_ids)
+    )
+    for _, event in chunk:
+        EVENTS_RECEIVED.labels(event_type=event.event_type.value).inc()
+
+@router.post("/batch", response_model=EventBatchResponse)
+async def create_events_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Create many events at once from a JSON array, or from NDJSON (one event per line)
+    streamed in chunks. Invalid items are reported per index and do not fail the batch.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    items = _ndjson_items(request) if content_type in NDJSON_CONTENT_TYPES else _json_items(request)
+
+    results: List[EventBatchItemResult] = []
+    chunk: List[Tuple[int, EventCreate]] = []
+    index = 0
+
+    async for item in items:
+        if isinstance(item, ValueError):
+            results.append(EventBatchItemResult(index=index, error=f"Invalid JSON: {item}"))
+        else:
+            try:
+                chunk.append((index, EventCreate.model_validate(item)))
+            except ValidationError as e:
+                results.append(EventBatchItemResult(index=index, error=_validation_message(e)))
+        index += 1
+
+        if len(chunk) >= settings.EVENT_INGEST_CHUNK_SIZE:
+            await _insert_chunk(db, chunk, results)
+            chunk = []
+
+    if chunk:
+        await _insert_chunk(db, chunk, results)
+
+    results.sort(key=lambda result: result.index)
+    accepted = sum(1 for result in results if result.id is not None)
+    return EventBatchResponse(accepted=accepted, rejected=len(results) - accepted, items=results)
+
 @router.get("/", response_model=List[EventResponse])
-async def get_events(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all events"""
-    events = db.query(Event).offset(skip).limit(limit).all()
+async def get_events(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0, deprecated=True),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get events page by page, optionally within a created_at range; follow the X-Next-Cursor
+    header for the next page. A range only scans the monthly partitions it overlaps.
+    """
+    query = select(Event)
+    if created_from:
+        query = query.where(Event.created_at >= created_from)
+    if created_to:
+        query = query.where(Event.created_at < created_to)
+    events = await keyset_page(db, query, Event.id, response, cursor, limit, skip)
     return events
 
 @router.get("/{event_id}", response_model=EventResponse)
-async def get_event(event_id: int, db: Session = Depends(get_db)):
+async def get_event(event_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get specific event"""
-    event = db.query(Event).filter(Event.id == event_id).first()
+    event = await db.get(Event, event_id)
     if not event:
         raise HTTPException(status_code=404, detail="Event not found")
     return event
\ No newline at end of file
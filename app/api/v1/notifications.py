@@ -1,31 +1,98 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.db.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, Select
+from typing import List, Optional, AsyncIterator
+from datetime import datetime
+from app.api.pagination import keyset_page, MAX_PAGE_SIZE
+from app.db.database import get_async_db, AsyncSessionLocal
 from app.schemas.notification import NotificationResponse
 from app.models.models import Notification, NotificationStatus
+import csv
+import enum
+import io
 
 router = APIRouter()
 
+class ExportFormat(str, enum.Enum):
+    JSON = "json"
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_COLUMNS = list(NotificationResponse.model_fields)
+
+async def export_rows(query: Select) -> AsyncIterator[List[NotificationResponse]]:
+    """
+    Stream matching notifications from a server-side cursor in chunks.
+    Uses its own session because the response body outlives the request dependency.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(query.order_by(Notification.id).execution_options(yield_per=EXPORT_CHUNK_SIZE))
+        async for partition in result.scalars().partitions():
+            yield [NotificationResponse.model_validate(row) for row in partition]
+            # Rows already serialized; drop them from the identity map to keep memory flat
+            db.expunge_all()
+
+async def export_ndjson(query: Select) -> AsyncIterator[str]:
+    async for chunk in export_rows(query):
+        yield "".join(row.model_dump_json() + "\n" for row in chunk)
+
+async def export_csv(query: Select) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for chunk in export_rows(query):
+        for row in chunk:
+            data = row.model_dump(mode="json")
+            writer.writerow(["" if data[column] is None else data[column] for column in EXPORT_COLUMNS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
 @router.get("/", response_model=List[NotificationResponse])
 async def get_notifications(
-    skip: int = 0, 
-    limit: int = 100, 
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0, deprecated=True),
     status: Optional[NotificationStatus] = None,
-    db: Session = Depends(get_db)
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    format: ExportFormat = ExportFormat.JSON,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all notifications with optional status filter"""
-    query = db.query(Notification)
+    """
+    Get notifications page by page with optional status and created_at range filters.
+    A created_at range only scans the monthly partitions it overlaps.
+    format=ndjson or format=csv streams every matching row instead of one page.
+    """
+    query = select(Notification)
     if status:
-        query = query.filter(Notification.status == status)
+        query = query.where(Notification.status == status)
+    if created_from:
+        query = query.where(Notification.created_at >= created_from)
+    if created_to:
+        query = query.where(Notification.created_at < created_to)
+    
+    if format == ExportFormat.NDJSON:
+        return StreamingResponse(export_ndjson(query), media_type="application/x-ndjson")
+    if format == ExportFormat.CSV:
+        return StreamingResponse(
+            export_csv(query),
+            media_type="text/csv",
+            headers={"Content-Disposition": "attachment; filename=notifications.csv"}
+        )
     
-    notifications = query.offset(skip).limit(limit).all()
+    notifications = await keyset_page(db, query, Notification.id, response, cursor, limit, skip)
     return notifications
 
 @router.get("/{notification_id}", response_model=NotificationResponse)
-async def get_notification(notification_id: int, db: Session = Depends(get_db)):
+async def get_notification(notification_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get specific notification"""
-    notification = db.query(Notification).filter(Notification.id == notification_id).first()
+    notification = await db.get(Notification, notification_id)
     if not notification:
         raise HTTPException(status_code=404, detail="Notification not found")
-    return notification
\ No newline at end of file
+    return notification
@@ -1,56 +1,68 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.db.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional
+from app.api.pagination import keyset_page, MAX_PAGE_SIZE
+from app.db.database import get_async_db
 from app.schemas.notification import NotificationRuleCreate, NotificationRuleResponse
 from app.models.models import NotificationRule
+from app.services.rules_engine import invalidate_rule_cache
 
 router = APIRouter()
 
 @router.post("/", response_model=NotificationRuleResponse)
-async def create_rule(rule: NotificationRuleCreate, db: Session = Depends(get_db)):
+async def create_rule(rule: NotificationRuleCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new notification rule"""
     db_rule = NotificationRule(**rule.dict())
     db.add(db_rule)
-    db.commit()
-    db.refresh(db_rule)
+    await db.commit()
+    await db.refresh(db_rule)
+    invalidate_rule_cache()
     return db_rule
 
 @router.get("/", response_model=List[NotificationRuleResponse])
-async def get_rules(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all notification rules"""
-    rules = db.query(NotificationRule).offset(skip).limit(limit).all()
+async def get_rules(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0, deprecated=True),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get notification rules page by page; follow the X-Next-Cursor header for the next page"""
+    rules = await keyset_page(db, select(NotificationRule), NotificationRule.id, response, cursor, limit, skip)
     return rules
 
 @router.get("/{rule_id}", response_model=NotificationRuleResponse)
-async def get_rule(rule_id: int, db: Session = Depends(get_db)):
+async def get_rule(rule_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get specific rule"""
-    rule = db.query(NotificationRule).filter(NotificationRule.id == rule_id).first()
+    rule = await db.get(NotificationRule, rule_id)
     if not rule:
         raise HTTPException(status_code=404, detail="Rule not found")
     return rule
 
 @router.put("/{rule_id}", response_model=NotificationRuleResponse)
-async def update_rule(rule_id: int, rule_update: NotificationRuleCreate, db: Session = Depends(get_db)):
+async def update_rule(rule_id: int, rule_update: NotificationRuleCreate, db: AsyncSession = Depends(get_async_db)):
     """Update a rule"""
-    rule = db.query(NotificationRule).filter(NotificationRule.id == rule_id).first()
+    rule = await db.get(NotificationRule, rule_id)
     if not rule:
         raise HTTPException(status_code=404, detail="Rule not found")
     
     for field, value in rule_update.dict().items():
         setattr(rule, field, value)
     
-    db.commit()
-    db.refresh(rule)
+    await db.commit()
+    await db.refresh(rule)
+    invalidate_rule_cache()
     return rule
 
 @router.delete("/{rule_id}")
-async def delete_rule(rule_id: int, db: Session = Depends(get_db)):
+async def delete_rule(rule_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a rule"""
-    rule = db.query(NotificationRule).filter(NotificationRule.id == rule_id).first()
+    rule = await db.get(NotificationRule, rule_id)
     if not rule:
         raise HTTPException(status_code=404, detail="Rule not found")
     
-    db.delete(rule)
-    db.commit()
+    await db.delete(rule)
+    await db.commit()
+    invalidate_rule_cache()
     return {"message": "Rule deleted successfully"}
@@ -1,31 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.db.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Response, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from typing import List, Optional
+from app.api.pagination import keyset_page, MAX_PAGE_SIZE
+from app.db.database import get_async_db
 from app.schemas.notification import NotificationTemplateCreate, NotificationTemplateResponse
 from app.models.models import NotificationTemplate
 
 router = APIRouter()
 
 @router.post("/", response_model=NotificationTemplateResponse)
-async def create_template(template: NotificationTemplateCreate, db: Session = Depends(get_db)):
+async def create_template(template: NotificationTemplateCreate, db: AsyncSession = Depends(get_async_db)):
     """Create a new notification template"""
     db_template = NotificationTemplate(**template.dict())
     db.add(db_template)
-    db.commit()
-    db.refresh(db_template)
+    await db.commit()
+    await db.refresh(db_template)
     return db_template
 
 @router.get("/", response_model=List[NotificationTemplateResponse])
-async def get_templates(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    """Get all templates"""
-    templates = db.query(NotificationTemplate).offset(skip).limit(limit).all()
+async def get_templates(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    skip: int = Query(0, ge=0, deprecated=True),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get templates page by page; follow the X-Next-Cursor header for the next page"""
+    templates = await keyset_page(db, select(NotificationTemplate), NotificationTemplate.id, response, cursor, limit, skip)
     return templates
 
 @router.get("/{template_id}", response_model=NotificationTemplateResponse)
-async def get_template(template_id: int, db: Session = Depends(get_db)):
+async def get_template(template_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get specific template"""
-    template = db.query(NotificationTemplate).filter(NotificationTemplate.id == template_id).first()
+    template = await db.get(NotificationTemplate, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
     return template
\ No newline at end of file
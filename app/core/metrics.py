@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST,
+    generate_latest, multiprocess, start_http_server
+)
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages take microseconds to seconds; queue waits and delivery up to minutes
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+EVENTS_RECEIVED = Counter(
+    "notification_events_received_total", "Events accepted by the API", ["event_type"]
+)
+STAGE_SECONDS = Histogram(
+    "notification_stage_seconds",
+    "Time spent in each pipeline stage (ingest, rule_match, render, insert, process_event)",
+    ["stage", "event_type"],
+    buckets=STAGE_BUCKETS
+)
+NOTIFICATIONS_CREATED = Counter(
+    "notification_created_total", "Notifications created from events", ["event_type", "channel"]
+)
+NOTIFICATIONS_COALESCED = Counter(
+    "notification_coalesced_total", "Notifications buffered and merged into digests", ["event_type", "channel"]
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "notification_queue_wait_seconds",
+    "Time from a notification becoming due to a worker claiming it",
+    ["channel", "priority"],
+    buckets=LATENCY_BUCKETS
+)
+SEND_SECONDS = Histogram(
+    "notification_send_seconds", "provider.send latency", ["channel", "outcome"], buckets=STAGE_BUCKETS
+)
+DELIVERIES = Counter(
+    "notification_deliveries_total", "Delivery attempts by outcome (sent, failed, deferred)", ["channel", "outcome"]
+)
+OUTBOX_PUBLISHED = Counter(
+    "notification_outbox_published_total", "Events published by the outbox relay", ["priority"]
+)
+DELIVERY_SECONDS = Histogram(
+    "notification_delivery_seconds",
+    "End-to-end latency from the event being accepted to its notification being sent",
+    ["event_type", "channel"],
+    buckets=LATENCY_BUCKETS
+)
+
+@contextmanager
+def timed(histogram: Histogram, **labels):
+    """Observe the duration of the block, including when it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - started)
+
+def epoch(value: Optional[datetime]) -> Optional[float]:
+    """Unix timestamp of a database datetime; naive values are UTC like the rest of the app"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Registry to expose. With PROMETHEUS_MULTIPROC_DIR set (several uvicorn workers, Celery
+    prefork children), samples are written there by every process and aggregated on scrape.
+    """
+    if not os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+def render_metrics() -> tuple:
+    """Body and content type of a /metrics response"""
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+def start_exporter(port: int):
+    """Serve /metrics on `port` from a background thread (Celery workers, relay process)"""
+    if not port:
+        return
+    try:
+        start_http_server(port, registry=metrics_registry())
+        logger.info(f"Metrics exporter listening on :{port}")
+    except OSError as e:
+        logger.error(f"Could not start metrics exporter on :{port}: {e}")
@@ -1,20 +1,68 @@
+from typing import Dict, Any, Optional
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.core.config import settings
 
+def engine_options(url: str) -> Dict[str, Any]:
+    # SQLite (local runs and tests) uses a pool that takes no sizing arguments
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_pre_ping": True,
+        "pool_recycle": 300,
+        "pool_size": 10,
+        "max_overflow": 20,
+    }
+
+def async_database_url(url: str, override: Optional[str] = None) -> str:
+    """Map the sync DATABASE_URL onto its asyncio driver (asyncpg / aiosqlite)"""
+    if override:
+        return override
+    scheme, sep, rest = url.partition("://")
+    driver = {
+        "postgresql": "postgresql+asyncpg",
+        "postgresql+psycopg2": "postgresql+asyncpg",
+        "postgres": "postgresql+asyncpg",
+        "sqlite": "sqlite+aiosqlite",
+        "sqlite+pysqlite": "sqlite+aiosqlite",
+    }.get(scheme, scheme)
+    return f"{driver}{sep}{rest}"
+
+def upsert_insert(db: Session, model):
+    """INSERT construct with ON CONFLICT support for the session's dialect"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    raise NotImplementedError(f"ON CONFLICT inserts are not supported on {dialect}")
+
 engine = create_engine(
     settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-    pool_size=10,
-    max_overflow=20
+    **engine_options(settings.DATABASE_URL)
 )
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+ASYNC_DATABASE_URL = async_database_url(settings.DATABASE_URL, settings.ASYNC_DATABASE_URL)
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    **engine_options(ASYNC_DATABASE_URL)
+)
+
+# Objects stay readable after commit so routes can return them without a lazy refresh
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
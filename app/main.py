@@ -1,12 +1,10 @@
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1 import events, rules, templates, notifications, analytics
+from app.api.v1 import events, rules, templates, notifications, analytics, audiences
 from app.core.config import settings
-from app.db.database import engine
-from app.models import models
+from app.core.metrics import render_metrics
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic: run `alembic upgrade head` before starting the API
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -30,6 +28,7 @@ app.include_router(rules.router, prefix=f"{settings.API_V1_STR}/rules", tags=["r
 app.include_router(templates.router, prefix=f"{settings.API_V1_STR}/templates", tags=["templates"])
 app.include_router(notifications.router, prefix=f"{settings.API_V1_STR}/notifications", tags=["notifications"])
 app.include_router(analytics.router, prefix=f"{settings.API_V1_STR}/analytics", tags=["analytics"])
+app.include_router(audiences.router, prefix=f"{settings.API_V1_STR}/audiences", tags=["audiences"])
 
 @app.get("/")
 async def root():
@@ -43,3 +42,9 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "notification-orchestrator"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Enum, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Enum, Float, Index, UniqueConstraint, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -20,6 +20,11 @@ class NotificationType(enum.Enum):
     PUSH = "push"
     WEBHOOK = "webhook"
 
+class NotificationPriority(enum.Enum):
+    HIGH = "high"
+    NORMAL = "normal"
+    BULK = "bulk"
+
 class EventType(enum.Enum):
     USER_SIGNUP = "user_signup"
     ORDER_PLACED = "order_placed"
@@ -40,11 +45,20 @@ class NotificationRule(Base):
     conditions = Column(JSON, default={})
     is_active = Column(Boolean, default=True)
     priority = Column(Integer, default=1)
+    # Coalescing: notifications per recipient are buffered for this many seconds and sent as one digest
+    coalesce_window_seconds = Column(Integer)
+    coalesce_max_count = Column(Integer)  # Flush a recipient's buffer early at this many items
+    digest_template_id = Column(Integer, ForeignKey("notification_templates.id"))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
-    template = relationship("NotificationTemplate", back_populates="rules")
+    template = relationship("NotificationTemplate", back_populates="rules", foreign_keys=[template_id])
     notifications = relationship("Notification", back_populates="rule")
+    
+    __table_args__ = (
+        # Active rules for an event type, in priority order
+        Index("ix_notification_rules_event_type_active", "event_type", "is_active", "priority"),
+    )
 
 class NotificationTemplate(Base):
     __tablename__ = "notification_templates"
@@ -55,30 +69,69 @@ class NotificationTemplate(Base):
     subject = Column(String(500))
     body = Column(Text, nullable=False)
     variables = Column(JSON, default={})
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
-    rules = relationship("NotificationRule", back_populates="template")
+    rules = relationship("NotificationRule", back_populates="template", foreign_keys="NotificationRule.template_id")
+    
+    # Bumped on every UPDATE so cached compiled templates are keyed by content
+    __mapper_args__ = {"version_id_col": version}
 
 class Notification(Base):
     __tablename__ = "notifications"
     
     id = Column(Integer, primary_key=True, index=True)
     rule_id = Column(Integer, ForeignKey("notification_rules.id"))
+    # No foreign key: events is partitioned on PostgreSQL, and its keys include created_at
+    event_id = Column(Integer)
     recipient = Column(String(255), nullable=False)
     notification_type = Column(Enum(NotificationType), nullable=False)
     subject = Column(String(500))
     body = Column(Text, nullable=False)
     status = Column(Enum(NotificationStatus), default=NotificationStatus.PENDING)
+    # Delivery lane (queue) the notification is dispatched on
+    priority = Column(
+        Enum(NotificationPriority), nullable=False,
+        default=NotificationPriority.NORMAL, server_default=NotificationPriority.NORMAL.name
+    )
     retry_count = Column(Integer, default=0)
     max_retries = Column(Integer, default=3)
     scheduled_at = Column(DateTime(timezone=True))
+    next_attempt_at = Column(DateTime(timezone=True))  # When a RETRYING row is released again
+    claimed_at = Column(DateTime(timezone=True))  # When a worker moved the row to PROCESSING
+    swept_at = Column(DateTime(timezone=True))  # When the pending sweeper last queued the row again
     sent_at = Column(DateTime(timezone=True))
     error_message = Column(Text)
-    metadata = Column(JSON, default={})
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # "metadata" is reserved on declarative classes, so map the column under another name
+    notification_metadata = Column("metadata", JSON, default={})
+    # Partition key on PostgreSQL; notifications created from an event take the event's created_at
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     rule = relationship("NotificationRule", back_populates="notifications")
+    
+    __table_args__ = (
+        # Pending sweeper and batch claim: due PENDING rows
+        Index(
+            "ix_notifications_pending_scheduled_at", "status", "scheduled_at",
+            postgresql_where=text("status = 'PENDING'")
+        ),
+        # Retry release: RETRYING rows in due order
+        Index(
+            "ix_notifications_retrying_next_attempt_at", "status", "next_attempt_at",
+            postgresql_where=text("status = 'RETRYING'")
+        ),
+        # Claim reaper: PROCESSING rows in claim order
+        Index(
+            "ix_notifications_processing_claimed_at", "status", "claimed_at",
+            postgresql_where=text("status = 'PROCESSING'")
+        ),
+        # Analytics: created_at ranges, covering the status / type breakdowns
+        Index("ix_notifications_created_at_status_type", "created_at", "status", "notification_type"),
+        # Dedup key: an event produces at most one notification per rule and recipient. Unique
+        # indexes of a partitioned table must contain the partition key, which is the event's created_at
+        Index("uq_notifications_event_rule_recipient", "event_id", "rule_id", "recipient", "created_at", unique=True),
+    )
 
 class Event(Base):
     __tablename__ = "events"
@@ -88,7 +141,73 @@ class Event(Base):
     user_id = Column(String(255))
     event_data = Column(JSON, nullable=False)
     processed = Column(Boolean, default=False)
+    # Partition key on PostgreSQL (monthly ranges, see app/services/partition_service.py)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+class Audience(Base):
+    """Named recipient list that an event can fan out to through its `audience_id`"""
+    __tablename__ = "audiences"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False, unique=True)
+    description = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    members = relationship("AudienceMember", back_populates="audience", cascade="all, delete-orphan", passive_deletes=True)
+
+class AudienceMember(Base):
+    __tablename__ = "audience_members"
+    
+    id = Column(Integer, primary_key=True)
+    audience_id = Column(Integer, ForeignKey("audiences.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(String(255))
+    # Contact fields (email, phone, device_token, webhook_url) and per-member template variables
+    attributes = Column(JSON, nullable=False, default={})
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    audience = relationship("Audience", back_populates="members")
+    
+    __table_args__ = (
+        # Fan-out streams members of one audience in id order
+        Index("ix_audience_members_audience_id_id", "audience_id", "id"),
+    )
+
+class EventOutbox(Base):
+    """Events waiting to be published to the broker, written in the same transaction as the event"""
+    __tablename__ = "event_outbox"
+    
+    id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    published_at = Column(DateTime(timezone=True))
+    
+    __table_args__ = (
+        # Relay: unpublished rows in id order; purge: old published rows
+        Index(
+            "ix_event_outbox_unpublished", "published_at", "id",
+            postgresql_where=text("published_at IS NULL")
+        ),
+        Index("ix_event_outbox_published_at", "published_at"),
+    )
+
+class DigestItem(Base):
+    """Event buffered for a coalescing rule, waiting to be merged into a recipient's digest"""
+    __tablename__ = "digest_items"
+    
+    id = Column(Integer, primary_key=True)
+    rule_id = Column(Integer, ForeignKey("notification_rules.id", ondelete="CASCADE"), nullable=False)
+    event_id = Column(Integer, nullable=False)
+    recipient = Column(String(255), nullable=False)
+    # Template context of the buffered notification
+    context = Column(JSON, nullable=False)
+    buffered_at = Column(DateTime(timezone=True), nullable=False)
+    
+    __table_args__ = (
+        # Flush: a recipient's buffer in arrival order, and its age and size per rule
+        Index("ix_digest_items_rule_recipient_id", "rule_id", "recipient", "id"),
+        # Same dedup key as notifications, so redelivered events are buffered once
+        Index("uq_digest_items_event_rule_recipient", "event_id", "rule_id", "recipient", unique=True),
+    )
 
 class NotificationStats(Base):
     __tablename__ = "notification_stats"
@@ -100,4 +219,24 @@ class NotificationStats(Base):
     total_failed = Column(Integer, default=0)
     total_retries = Column(Integer, default=0)
     avg_delivery_time = Column(Float, default=0.0)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class NotificationHourlyStats(Base):
+    """Delivery counters per hour and channel, incremented as notifications are created and delivered"""
+    __tablename__ = "notification_hourly_stats"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    hour = Column(DateTime(timezone=True), nullable=False)
+    notification_type = Column(Enum(NotificationType), nullable=False)
+    # Counters of an hour and type are spread over STATS_COUNTER_SLOTS rows to avoid lock contention
+    slot = Column(Integer, nullable=False, default=0, server_default="0")
+    total_created = Column(Integer, nullable=False, default=0, server_default="0")
+    total_sent = Column(Integer, nullable=False, default=0, server_default="0")
+    total_failed = Column(Integer, nullable=False, default=0, server_default="0")
+    total_retries = Column(Integer, nullable=False, default=0, server_default="0")
+    # Seconds from creation to SENT, summed over total_sent
+    delivery_time_total = Column(Float, nullable=False, default=0.0, server_default="0")
+    
+    __table_args__ = (
+        UniqueConstraint("hour", "notification_type", "slot", name="uq_notification_hourly_stats_hour_type_slot"),
+    )
\ No newline at end of file
@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, validator
+from pydantic import BaseModel, EmailStr, Field, validator
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from app.models.models import NotificationStatus, NotificationType, EventType
+from app.services.conditions import compile_conditions
 
 # Event Schemas
 class EventCreate(BaseModel):
@@ -20,6 +21,46 @@ class EventResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class EventBatchItemResult(BaseModel):
+    index: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class EventBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    items: List[EventBatchItemResult]
+
+# Audience Schemas
+class AudienceCreate(BaseModel):
+    name: str
+    description: Optional[str] = None
+
+class AudienceResponse(BaseModel):
+    id: int
+    name: str
+    description: Optional[str]
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class AudienceMemberCreate(BaseModel):
+    user_id: Optional[str] = None
+    attributes: Dict[str, Any] = {}
+
+class AudienceMemberResponse(BaseModel):
+    id: int
+    audience_id: int
+    user_id: Optional[str]
+    attributes: Dict[str, Any]
+
+    class Config:
+        from_attributes = True
+
+class AudienceMembersAdded(BaseModel):
+    added: int
+
 # Template Schemas
 class NotificationTemplateCreate(BaseModel):
     name: str
@@ -48,6 +89,15 @@ class NotificationRuleCreate(BaseModel):
     template_id: int
     conditions: Dict[str, Any] = {}
     priority: int = 1
+    coalesce_window_seconds: Optional[int] = Field(None, gt=0)
+    coalesce_max_count: Optional[int] = Field(None, gt=1)
+    digest_template_id: Optional[int] = None
+
+    @validator("conditions")
+    def check_conditions(cls, conditions):
+        # Rejects unknown operators, bad values and malformed groups that evaluation would skip
+        compile_conditions(conditions, strict=True)
+        return conditions
 
 class NotificationRuleResponse(BaseModel):
     id: int
@@ -58,6 +108,9 @@ class NotificationRuleResponse(BaseModel):
     conditions: Dict[str, Any]
     is_active: bool
     priority: int
+    coalesce_window_seconds: Optional[int]
+    coalesce_max_count: Optional[int]
+    digest_template_id: Optional[int]
     created_at: datetime
 
     class Config:
@@ -0,0 +1,28 @@
+from typing import Dict, Any, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from app.models.models import AudienceMember
+from app.services.conditions import Condition, compile_conditions
+import logging
+
+logger = logging.getLogger(__name__)
+
+def compile_segment(conditions: Optional[Dict[str, Any]]) -> Condition:
+    """
+    Compile an event's `segment` into a member filter. Segments use the rule
+    condition language and are evaluated against each member's attributes.
+    """
+    return compile_conditions(conditions)
+
+class AudienceService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def member_chunk(self, audience_id: int, after_id: int, limit: int) -> list:
+        """Next `limit` members of an audience after member id `after_id`, in id order"""
+        return self.db.execute(
+            select(AudienceMember.id, AudienceMember.user_id, AudienceMember.attributes)
+            .where(AudienceMember.audience_id == audience_id, AudienceMember.id > after_id)
+            .order_by(AudienceMember.id)
+            .limit(limit)
+        ).all()
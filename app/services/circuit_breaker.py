@@ -0,0 +1,152 @@
+from typing import Deque, Optional
+from collections import OrderedDict, deque
+from enum import Enum
+from urllib.parse import urlsplit
+from app.core.config import settings
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+class CircuitOpen(Exception):
+    """Raised instead of sending to a destination whose circuit is open"""
+
+    def __init__(self, destination: str, retry_after: float):
+        super().__init__(f"Circuit open for {destination}, retry in {retry_after:.2f}s")
+        self.destination = destination
+        self.retry_after = retry_after
+
+def destination_key(notification_type: str, recipient: str) -> str:
+    """Webhooks are tracked per host; other channels share one upstream provider each"""
+    if notification_type == 'webhook':
+        host = urlsplit(recipient).netloc.lower()
+        if host:
+            return f"webhook:{host}"
+    return notification_type
+
+class CircuitBreaker:
+    """
+    Trips when the share of failed or slow calls in the last CIRCUIT_WINDOW_SIZE
+    calls reaches CIRCUIT_ERROR_THRESHOLD. After CIRCUIT_OPEN_SECONDS it lets
+    CIRCUIT_HALF_OPEN_PROBES calls through; their outcome closes or re-opens it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CircuitState.CLOSED
+        self.outcomes: Deque[bool] = deque(maxlen=settings.CIRCUIT_WINDOW_SIZE)
+        self.opened_at = 0.0
+        self.probes = 0
+
+    def before_call(self) -> bool:
+        """Admit a call or raise CircuitOpen; returns whether the call is a half-open probe"""
+        if self.state == CircuitState.OPEN:
+            remaining = self.opened_at + settings.CIRCUIT_OPEN_SECONDS - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpen(self.name, remaining)
+            self.state = CircuitState.HALF_OPEN
+            self.probes = 0
+            logger.info(f"Circuit for {self.name} half-open, probing")
+
+        if self.state == CircuitState.HALF_OPEN:
+            if self.probes >= settings.CIRCUIT_HALF_OPEN_PROBES:
+                raise CircuitOpen(self.name, settings.CIRCUIT_OPEN_SECONDS)
+            self.probes += 1
+            return True
+        return False
+
+    def cancel_probe(self):
+        """Give back a probe slot admitted by before_call for a call that was never made"""
+        self.probes -= 1
+
+    def after_call(self, success: bool, latency: float, probe: bool = False):
+        healthy = success and latency <= settings.CIRCUIT_SLOW_CALL_SECONDS
+        if probe:
+            self.probes -= 1
+            if self.state != CircuitState.HALF_OPEN:
+                return
+            if healthy:
+                self.state = CircuitState.CLOSED
+                self.outcomes.clear()
+                logger.info(f"Circuit for {self.name} closed")
+            else:
+                self._open()
+            return
+
+        self.outcomes.append(healthy)
+        if self.state == CircuitState.CLOSED and len(self.outcomes) >= settings.CIRCUIT_MIN_CALLS:
+            error_rate = self.outcomes.count(False) / len(self.outcomes)
+            if error_rate >= settings.CIRCUIT_ERROR_THRESHOLD:
+                self._open()
+
+    def _open(self):
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        logger.warning(f"Circuit for {self.name} opened for {settings.CIRCUIT_OPEN_SECONDS}s")
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight calls: grows by about one per limit's worth of calls
+    that finish within DESTINATION_LATENCY_TARGET, and is cut by
+    DESTINATION_BACKOFF_RATIO on a failure or a slow call.
+    """
+
+    def __init__(self):
+        self.limit = float(settings.DESTINATION_INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+        self._decreased_at = 0.0
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, success: bool, latency: Optional[float]):
+        """Give the slot back; latency is None when the call never reached the destination"""
+        if latency is not None:
+            self._adjust(success, latency)
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def _adjust(self, success: bool, latency: float):
+        if success and latency <= settings.DESTINATION_LATENCY_TARGET:
+            self.limit = min(self.limit + 1 / self.limit, float(settings.DESTINATION_MAX_CONCURRENCY))
+            return
+        # Calls that were already in flight report the same congestion; cut once per target interval
+        now = time.monotonic()
+        if now - self._decreased_at >= settings.DESTINATION_LATENCY_TARGET:
+            self.limit = max(self.limit * settings.DESTINATION_BACKOFF_RATIO,
+                             float(settings.DESTINATION_MIN_CONCURRENCY))
+            self._decreased_at = now
+
+class Destination:
+    def __init__(self, name: str):
+        self.breaker = CircuitBreaker(name)
+        self.concurrency = AdaptiveConcurrency()
+
+class DestinationRegistry:
+    """Per-destination breaker and concurrency state, kept for the most recently used destinations"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._destinations: "OrderedDict[str, Destination]" = OrderedDict()
+
+    def get(self, name: str) -> Destination:
+        destination = self._destinations.get(name)
+        if destination is None:
+            destination = self._destinations[name] = Destination(name)
+            if len(self._destinations) > self.max_size:
+                # Calls in flight keep their own reference, so eviction is safe
+                self._destinations.popitem(last=False)
+        else:
+            self._destinations.move_to_end(name)
+        return destination
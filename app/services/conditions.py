@@ -0,0 +1,387 @@
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+import re
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Predicate = Callable[[Dict[str, Any]], bool]
+
+# Value of a field path that isn't in the event
+MISSING = object()
+
+NUMERIC_OPERATORS = ("greater_than", "less_than", "greater_or_equal", "less_or_equal", "between")
+OPERATORS = (
+    "equals", "not_equals", *NUMERIC_OPERATORS, "contains", "regex",
+    "in_list", "not_in_list", "exists", "not_exists",
+)
+
+def resolve(data: Any, path: str) -> Any:
+    """
+    Value of a field path in event data, or MISSING. A key containing dots is looked up
+    as is first; otherwise each dot descends into a nested object or list index.
+    """
+    if not isinstance(data, dict):
+        return MISSING
+    if path in data:
+        return data[path]
+    if "." not in path:
+        return MISSING
+    value = data
+    for key in path.split("."):
+        if isinstance(value, dict):
+            if key not in value:
+                return MISSING
+            value = value[key]
+        elif isinstance(value, list) and key.isdecimal() and int(key) < len(value):
+            value = value[int(key)]
+        else:
+            return MISSING
+    return value
+
+def is_hashable(value: Any) -> bool:
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    # NaN never compares equal to itself, so it can't be served from a hash bucket
+    return value == value
+
+def _safe(test: Callable[[Any], bool], value: Any) -> bool:
+    try:
+        return bool(test(value))
+    except Exception:
+        return False
+
+class ColumnBatch:
+    """
+    Event data of one batch, read column by column. Each field path is resolved once
+    per batch and its columns are shared by every rule evaluated against it.
+    """
+
+    def __init__(self, rows: Sequence[Any]):
+        self.rows = rows
+        self.size = len(rows)
+        self._columns: Dict[Tuple[str, str], Any] = {}
+
+    def _column(self, kind: str, path: str, build: Callable[[], Any]) -> Any:
+        key = (kind, path)
+        if key not in self._columns:
+            self._columns[key] = build()
+        return self._columns[key]
+
+    def values(self, path: str) -> List[Any]:
+        return self._column("values", path, lambda: [resolve(row, path) for row in self.rows])
+
+    def present(self, path: str) -> np.ndarray:
+        return self._column("present", path, lambda: np.fromiter(
+            (value is not MISSING for value in self.values(path)), bool, self.size
+        ))
+
+    def numbers(self, path: str) -> Tuple[np.ndarray, np.ndarray]:
+        """float() of every value, with a mask of the values that are present and convert"""
+        def build():
+            numbers = np.zeros(self.size, dtype=np.float64)
+            valid = np.zeros(self.size, dtype=bool)
+            for row, value in enumerate(self.values(path)):
+                if value is MISSING:
+                    continue
+                try:
+                    numbers[row] = float(value)
+                    valid[row] = True
+                except Exception:
+                    pass
+            return numbers, valid
+        return self._column("numbers", path, build)
+
+    def codes(self, path: str) -> Tuple[np.ndarray, Dict[Any, int], np.ndarray]:
+        """
+        Values factorized for equality tests: an integer code per row (equal values share
+        one), the code of each distinct value, and the rows that can't be coded
+        (unhashable values and NaN), which are compared one by one
+        """
+        def build():
+            codes = np.full(self.size, -1, dtype=np.int64)
+            lookup: Dict[Any, int] = {}
+            irregular = []
+            for row, value in enumerate(self.values(path)):
+                if value is MISSING:
+                    continue
+                if not is_hashable(value):
+                    irregular.append(row)
+                    continue
+                codes[row] = lookup.setdefault(value, len(lookup))
+            return codes, lookup, np.array(irregular, dtype=np.int64)
+        return self._column("codes", path, build)
+
+    def strings(self, path: str) -> List[Optional[str]]:
+        return self._column("strings", path, lambda: [
+            None if value is MISSING else str(value) for value in self.values(path)
+        ])
+
+class Condition:
+    """
+    Node of a compiled condition plan. `predicate` evaluates one event; `mask` evaluates
+    a ColumnBatch into a boolean array with the same result for every event.
+    """
+    predicate: Predicate
+
+    def mask(self, batch: ColumnBatch) -> np.ndarray:
+        raise NotImplementedError
+
+    def evaluate_many(self, rows: Sequence[Any]) -> np.ndarray:
+        return self.mask(ColumnBatch(rows))
+
+class Constant(Condition):
+    def __init__(self, value: bool):
+        self.value = value
+        self.predicate = lambda data: value
+
+    def mask(self, batch: ColumnBatch) -> np.ndarray:
+        return np.full(batch.size, self.value, dtype=bool)
+
+ALWAYS = Constant(True)
+NEVER = Constant(False)
+
+class Comparison(Condition):
+    """One `{"operator", "value"}` test of a field path. A missing field fails every operator but `not_exists`."""
+
+    def __init__(
+        self,
+        path: str,
+        operator: str,
+        value: Any,
+        test: Optional[Callable[[Any], bool]],
+        threshold: Optional[float] = None,
+        bounds: Optional[Tuple[float, float]] = None
+    ):
+        self.path = path
+        self.operator = operator
+        self.value = value
+        # None when the value is invalid for the operator: the comparison never matches
+        self.test = test
+        self.threshold = threshold
+        self.bounds = bounds
+
+        if operator == "not_exists":
+            def predicate(data):
+                return resolve(data, path) is MISSING
+        elif test is None:
+            def predicate(data):
+                return False
+        else:
+            def predicate(data):
+                field_value = resolve(data, path)
+                return field_value is not MISSING and _safe(test, field_value)
+        self.predicate = predicate
+
+    def index_values(self) -> Optional[Tuple[Any, ...]]:
+        """Values an event field must hold to pass, when they can serve as hash lookup keys"""
+        if self.operator == "equals" and is_hashable(self.value):
+            return (self.value,)
+        if (self.operator == "in_list" and isinstance(self.value, (list, tuple, set, frozenset))
+                and all(is_hashable(v) for v in self.value)):
+            return tuple(self.value)
+        return None
+
+    def _fallback(self, batch: ColumnBatch, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Row-by-row evaluation of the test, over every row or only `rows`"""
+        values = batch.values(self.path)
+        mask = np.zeros(batch.size, dtype=bool)
+        for row in (range(batch.size) if rows is None else rows):
+            value = values[row]
+            mask[row] = value is not MISSING and _safe(self.test, value)
+        return mask
+
+    def _patch_irregular(self, batch: ColumnBatch, mask: np.ndarray) -> np.ndarray:
+        _, _, irregular = batch.codes(self.path)
+        if len(irregular):
+            mask[irregular] = self._fallback(batch, irregular)[irregular]
+        return mask
+
+    def mask(self, batch: ColumnBatch) -> np.ndarray:
+        operator, value = self.operator, self.value
+        if operator == "not_exists":
+            return ~batch.present(self.path)
+        if self.test is None:
+            return np.zeros(batch.size, dtype=bool)
+        if operator == "exists":
+            return batch.present(self.path).copy()
+
+        if operator in NUMERIC_OPERATORS:
+            numbers, valid = batch.numbers(self.path)
+            if operator == "between":
+                low, high = self.bounds
+                return valid & (numbers >= low) & (numbers <= high)
+            compare = {
+                "greater_than": np.greater,
+                "less_than": np.less,
+                "greater_or_equal": np.greater_equal,
+                "less_or_equal": np.less_equal,
+            }[operator]
+            return valid & compare(numbers, self.threshold)
+
+        if operator in ("equals", "not_equals") and is_hashable(value):
+            codes, lookup, _ = batch.codes(self.path)
+            code = lookup.get(value, -2)
+            mask = codes == code if operator == "equals" else (codes >= 0) & (codes != code)
+            return self._patch_irregular(batch, mask)
+
+        if operator in ("in_list", "not_in_list") and isinstance(value, (list, tuple, set, frozenset)):
+            codes, lookup, _ = batch.codes(self.path)
+            # Unhashable and NaN list items never equal a codable value
+            listed = [lookup[item] for item in value if is_hashable(item) and item in lookup]
+            mask = np.isin(codes, listed)
+            if operator == "not_in_list":
+                mask = (codes >= 0) & ~mask
+            return self._patch_irregular(batch, mask)
+
+        if operator in ("contains", "regex"):
+            strings = batch.strings(self.path)
+            test = self.test
+            return np.fromiter(
+                (string is not None and _safe(test, string) for string in strings), bool, batch.size
+            )
+
+        return self._fallback(batch)
+
+class AllOf(Condition):
+    def __init__(self, children: List[Condition]):
+        self.children = children
+        predicates = [child.predicate for child in children]
+        self.predicate = lambda data: all(predicate(data) for predicate in predicates)
+
+    def mask(self, batch: ColumnBatch) -> np.ndarray:
+        mask = np.ones(batch.size, dtype=bool)
+        for child in self.children:
+            mask &= child.mask(batch)
+            if not mask.any():
+                break
+        return mask
+
+class AnyOf(Condition):
+    def __init__(self, children: List[Condition]):
+        self.children = children
+        predicates = [child.predicate for child in children]
+        self.predicate = lambda data: any(predicate(data) for predicate in predicates)
+
+    def mask(self, batch: ColumnBatch) -> np.ndarray:
+        mask = np.zeros(batch.size, dtype=bool)
+        for child in self.children:
+            mask |= child.mask(batch)
+            if mask.all():
+                break
+        return mask
+
+class NotOf(Condition):
+    def __init__(self, child: Condition):
+        self.child = child
+        predicate = child.predicate
+        self.predicate = lambda data: not predicate(data)
+
+    def mask(self, batch: ColumnBatch) -> np.ndarray:
+        return ~self.child.mask(batch)
+
+def _invalid(message: str, strict: bool):
+    if strict:
+        raise ValueError(message)
+    logger.warning(f"Invalid rule condition, never matches: {message}")
+
+def compile_comparison(path: str, operator: Any, value: Any, strict: bool = False) -> Optional[Comparison]:
+    """Compile one field test. Returns None for unknown operators, which are ignored."""
+    if operator not in OPERATORS:
+        if strict:
+            raise ValueError(f"Unknown operator {operator!r} for field {path!r}")
+        return None
+
+    test = None
+    threshold = None
+    bounds = None
+    if operator in ("exists", "not_exists"):
+        test = lambda field_value: True
+    elif operator == "equals":
+        test = lambda field_value: field_value == value
+    elif operator == "not_equals":
+        test = lambda field_value: field_value != value
+    elif operator == "between":
+        try:
+            if not isinstance(value, (list, tuple)):
+                raise TypeError
+            low, high = (float(bound) for bound in value)
+        except (TypeError, ValueError):
+            _invalid(f"between on {path!r} needs a [low, high] pair of numbers", strict)
+        else:
+            bounds = (low, high)
+            test = lambda field_value: low <= float(field_value) <= high
+    elif operator in NUMERIC_OPERATORS:
+        try:
+            threshold = float(value)
+        except (TypeError, ValueError):
+            _invalid(f"{operator} on {path!r} needs a number", strict)
+        else:
+            test = {
+                "greater_than": lambda field_value: float(field_value) > threshold,
+                "less_than": lambda field_value: float(field_value) < threshold,
+                "greater_or_equal": lambda field_value: float(field_value) >= threshold,
+                "less_or_equal": lambda field_value: float(field_value) <= threshold,
+            }[operator]
+    elif operator == "contains":
+        if isinstance(value, str):
+            test = lambda field_value: value in str(field_value)
+        else:
+            _invalid(f"contains on {path!r} needs a string", strict)
+    elif operator == "regex":
+        try:
+            pattern = re.compile(value)
+            test = lambda field_value: pattern.search(str(field_value)) is not None
+        except (TypeError, re.error) as e:
+            _invalid(f"regex on {path!r} is not a valid pattern: {e}", strict)
+    elif operator in ("in_list", "not_in_list"):
+        if strict and not isinstance(value, list):
+            raise ValueError(f"{operator} on {path!r} needs a list")
+        if isinstance(value, (list, tuple)):
+            # By equality only: `in` also matches by identity, which would let NaN match itself
+            listed = lambda field_value: any(field_value == item for item in value)
+        else:
+            listed = lambda field_value: field_value in value
+        if operator == "in_list":
+            test = listed
+        else:
+            test = lambda field_value: not listed(field_value)
+
+    return Comparison(path, operator, value, test, threshold, bounds)
+
+def compile_conditions(conditions: Any, strict: bool = False) -> Condition:
+    """
+    Compile a condition document into an evaluation plan. A dict is an AND of its
+    entries: `{path: {"operator": ..., "value": ...}}` field tests, where the path may
+    reach into nested objects with dots, and the groups `"all": [...]`, `"any": [...]`
+    and `"not": {...}` of nested documents. Empty conditions match every event and any
+    other non-dict matches none. Malformed entries are skipped, or raise ValueError
+    when `strict` (API validation).
+    """
+    if not conditions:
+        return ALWAYS
+    if not isinstance(conditions, dict):
+        if strict:
+            raise ValueError("Conditions must be an object")
+        return NEVER
+
+    children: List[Condition] = []
+    for key, condition in conditions.items():
+        if key in ("all", "any") and isinstance(condition, list):
+            group = [compile_conditions(item, strict) for item in condition]
+            children.append(AllOf(group) if key == "all" else AnyOf(group))
+            continue
+        if key == "not" and isinstance(condition, dict) and "operator" not in condition:
+            children.append(NotOf(compile_conditions(condition, strict)))
+            continue
+        if not isinstance(condition, dict):
+            if strict:
+                raise ValueError(f"Condition for {key!r} must be an object with an operator")
+            continue
+        comparison = compile_comparison(key, condition.get("operator"), condition.get("value"), strict)
+        if comparison is not None:
+            children.append(comparison)
+    return AllOf(children)
@@ -0,0 +1,175 @@
+from typing import Dict, Any, List, Optional, NamedTuple, Coroutine
+from concurrent.futures import ThreadPoolExecutor
+from app.services.notification_providers import NotificationServiceFactory
+from app.services.rate_limiter import RateLimited, create_rate_limiter
+from app.services.circuit_breaker import CircuitOpen, DestinationRegistry, destination_key
+from app.core.config import settings
+from app.core.metrics import SEND_SECONDS
+import asyncio
+import atexit
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Sends that were not attempted and should be retried later without counting as a failure
+DEFERRED_ERRORS = (RateLimited, CircuitOpen)
+
+class DeliveryRequest(NamedTuple):
+    notification_type: str
+    recipient: str
+    subject: str
+    body: str
+    metadata: Optional[Dict[str, Any]] = None
+
+class DeliveryResult(NamedTuple):
+    sent: bool
+    # Set when the send was deferred (rate limit or open circuit) instead of attempted
+    retry_after: Optional[float] = None
+
+def channel_concurrency() -> Dict[str, int]:
+    return {
+        'email': settings.EMAIL_CONCURRENCY,
+        'sms': settings.SMS_CONCURRENCY,
+        'push': settings.PUSH_CONCURRENCY,
+        'webhook': settings.WEBHOOK_CONCURRENCY,
+    }
+
+class DeliveryEngine:
+    """
+    Long-lived asyncio loop running on a background thread of the worker process.
+    Sends from any thread are scheduled onto it, so many deliveries stay in flight
+    at once, capped per channel by a semaphore.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        # Blocking transports (pooled smtplib) run here instead of on the loop
+        self.loop.set_default_executor(ThreadPoolExecutor(
+            max_workers=max(settings.EMAIL_CONCURRENCY, 1),
+            thread_name_prefix="delivery-io"
+        ))
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.rate_limiter = create_rate_limiter()
+        self.destinations = DestinationRegistry()
+        self._thread = threading.Thread(target=self._run, name="delivery-loop", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _semaphore(self, notification_type: str) -> asyncio.Semaphore:
+        semaphore = self._semaphores.get(notification_type)
+        if semaphore is None:
+            limit = channel_concurrency().get(notification_type, settings.WEBHOOK_CONCURRENCY)
+            semaphore = self._semaphores[notification_type] = asyncio.Semaphore(limit)
+        return semaphore
+
+    async def deliver(self, request: DeliveryRequest) -> bool:
+        """
+        Send one notification through its channel provider, after taking a token from
+        its rate limit buckets and a slot from its destination's adaptive limit.
+        Raises RateLimited or CircuitOpen when the send should be deferred.
+        """
+        notification_type = request.notification_type.lower()
+        provider = NotificationServiceFactory.get_provider(notification_type)
+        if not provider:
+            raise ValueError(f"No provider for {request.notification_type}")
+
+        destination = self.destinations.get(destination_key(notification_type, request.recipient))
+        # Wait for the destination before taking a channel slot, so a slow host can't hold them
+        await destination.concurrency.acquire()
+        success = False
+        latency = None
+        try:
+            # Checked once a slot is held, so calls queued behind a tripped circuit fail fast
+            probe = destination.breaker.before_call()
+            try:
+                await self.rate_limiter.throttle(notification_type, request.recipient)
+                async with self._semaphore(notification_type):
+                    started = time.monotonic()
+                    outcome = "error"
+                    try:
+                        success = await provider.send(
+                            recipient=request.recipient,
+                            subject=request.subject,
+                            body=request.body,
+                            metadata=request.metadata
+                        )
+                        outcome = "sent" if success else "failed"
+                    finally:
+                        latency = time.monotonic() - started
+                        destination.breaker.after_call(success, latency, probe)
+                        SEND_SECONDS.labels(channel=notification_type, outcome=outcome).observe(latency)
+            except RateLimited:
+                if probe:
+                    destination.breaker.cancel_probe()
+                raise
+            return success
+        finally:
+            await destination.concurrency.release(success, latency)
+
+    async def deliver_many(self, requests: List[DeliveryRequest]) -> List[DeliveryResult]:
+        """
+        Send notifications concurrently. A raised error counts as a failed send;
+        a deferred one is reported with its retry_after and was not attempted.
+        """
+        results = await asyncio.gather(
+            *(self.deliver(request) for request in requests),
+            return_exceptions=True
+        )
+        outcomes = []
+        for request, result in zip(requests, results):
+            if isinstance(result, DEFERRED_ERRORS):
+                outcomes.append(DeliveryResult(False, result.retry_after))
+            elif isinstance(result, BaseException):
+                logger.error(f"Delivery to {request.recipient} raised: {result}")
+                outcomes.append(DeliveryResult(False))
+            else:
+                outcomes.append(DeliveryResult(bool(result)))
+        return outcomes
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the engine loop from a synchronous caller and wait for it"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def deliver_sync(self, request: DeliveryRequest) -> bool:
+        return self.run(self.deliver(request))
+
+    def deliver_many_sync(self, requests: List[DeliveryRequest]) -> List[DeliveryResult]:
+        return self.run(self.deliver_many(requests))
+
+    def shutdown(self):
+        if not self.loop.is_running():
+            return
+        try:
+            self.run(NotificationServiceFactory.aclose_all(), timeout=10)
+        except Exception as e:
+            logger.error(f"Error closing provider pools: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=10)
+
+_engine: Optional[DeliveryEngine] = None
+_engine_pid: Optional[int] = None
+_engine_lock = threading.Lock()
+
+def get_delivery_engine() -> DeliveryEngine:
+    """Return the delivery engine of this worker process, starting it on first use"""
+    global _engine, _engine_pid
+    if _engine_pid != os.getpid():
+        with _engine_lock:
+            if _engine_pid != os.getpid():
+                _engine = DeliveryEngine()
+                _engine_pid = os.getpid()
+    return _engine
+
+@atexit.register
+def shutdown_delivery_engine():
+    global _engine, _engine_pid
+    with _engine_lock:
+        engine, _engine, _engine_pid = _engine, None, None
+    if engine is not None and engine._thread.is_alive():
+        engine.shutdown()
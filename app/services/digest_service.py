@@ -0,0 +1,96 @@
+from typing import Dict, Any, List, Tuple
+from sqlalchemy.orm import Session
+from sqlalchemy import select, delete, func
+from app.db.database import upsert_insert
+from app.models.models import DigestItem, NotificationRule
+from app.core.config import settings
+from app.core.metrics import epoch
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def digest_limit(rule: Any) -> int:
+    """Items that fill a recipient's buffer for `rule` and flush it before the window ends"""
+    return rule.coalesce_max_count or settings.DIGEST_MAX_ITEMS
+
+def digest_context(items: list) -> Dict[str, Any]:
+    """
+    Template context of a digest: the latest item's variables, plus `items` (every
+    buffered context in arrival order) and `digest_count`
+    """
+    contexts = [item.context for item in items]
+    return {**contexts[-1], 'items': contexts, 'digest_count': len(contexts)}
+
+class DigestService:
+    """Database-backed buffer of notifications waiting to be merged into per-recipient digests"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def buffer(self, rows: List[Dict[str, Any]]) -> List[Tuple[int, str]]:
+        """
+        Add items to their recipients' buffers; items already buffered for the same
+        (event_id, rule_id, recipient) are skipped. Returns the (rule_id, recipient)
+        groups that received an item.
+        """
+        if not rows:
+            return []
+        stmt = upsert_insert(self.db, DigestItem).on_conflict_do_nothing(
+            index_elements=["event_id", "rule_id", "recipient"]
+        ).returning(DigestItem.rule_id, DigestItem.recipient)
+        return sorted({(row.rule_id, row.recipient) for row in self.db.execute(stmt, rows)})
+
+    def buffered_count(self, rule_id: int, recipient: str) -> int:
+        return self.db.execute(
+            select(func.count(DigestItem.id))
+            .where(DigestItem.rule_id == rule_id, DigestItem.recipient == recipient)
+        ).scalar_one()
+
+    def due_groups(self) -> List[Tuple[int, str]]:
+        """
+        (rule_id, recipient) groups whose oldest item is older than the rule's window,
+        whose buffer is full, or whose rule no longer coalesces
+        """
+        groups = self.db.execute(
+            select(
+                DigestItem.rule_id,
+                DigestItem.recipient,
+                func.min(DigestItem.buffered_at).label("oldest"),
+                func.count(DigestItem.id).label("count"),
+                NotificationRule.coalesce_window_seconds,
+                NotificationRule.coalesce_max_count
+            )
+            .join(NotificationRule, NotificationRule.id == DigestItem.rule_id)
+            .group_by(
+                DigestItem.rule_id, DigestItem.recipient,
+                NotificationRule.coalesce_window_seconds, NotificationRule.coalesce_max_count
+            )
+        ).all()
+
+        now = time.time()
+        return [
+            (group.rule_id, group.recipient)
+            for group in groups
+            if not group.coalesce_window_seconds
+            or epoch(group.oldest) <= now - group.coalesce_window_seconds
+            or group.count >= digest_limit(group)
+        ]
+
+    def take(self, rule_id: int, recipient: str, limit: int) -> list:
+        """
+        Remove and return up to `limit` of a recipient's oldest items, in arrival order.
+        Items locked by a concurrent flush are skipped, so each is taken exactly once;
+        a rollback puts them back.
+        """
+        oldest = select(DigestItem.id).where(
+            DigestItem.rule_id == rule_id, DigestItem.recipient == recipient
+        ).order_by(DigestItem.id).limit(limit).with_for_update(skip_locked=True)
+
+        items = self.db.execute(
+            delete(DigestItem)
+            .where(DigestItem.id.in_(oldest.scalar_subquery()))
+            .returning(DigestItem.id, DigestItem.event_id, DigestItem.context)
+            .execution_options(synchronize_session=False)
+        ).all()
+        return sorted(items, key=lambda item: item.id)
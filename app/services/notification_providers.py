@@ -1,57 +1,189 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-import requests
+import httpx
+import asyncio
 import logging
+import os
+import threading
+import time
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+class SMTPConnectionPool:
+    """
+    Pool of authenticated SMTP connections reused across messages.
+    Connections idle longer than idle_timeout are closed; connections idle longer
+    than health_check_interval are probed with NOOP before being handed out.
+    """
+
+    def __init__(self, host: str, port: int, user: Optional[str], password: Optional[str],
+                 max_size: int, idle_timeout: float, health_check_interval: float, timeout: float):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self._idle: "deque[Tuple[smtplib.SMTP, float]]" = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        server.starttls()
+        if self.user:
+            server.login(self.user, self.password)
+        return server
+
+    @staticmethod
+    def _close(server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    @staticmethod
+    def _is_healthy(server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except Exception:
+            return False
+
+    def _checkout(self) -> Tuple[smtplib.SMTP, bool]:
+        """Return an idle connection if a usable one exists, else open a new one"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            idle_for = time.monotonic() - last_used
+            if idle_for >= self.idle_timeout:
+                self._close(server)
+                continue
+            if idle_for >= self.health_check_interval and not self._is_healthy(server):
+                self._close(server)
+                continue
+            return server, True
+        return self._connect(), False
+
+    def _checkin(self, server: smtplib.SMTP):
+        with self._lock:
+            self._idle.append((server, time.monotonic()))
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            server, reused = self._checkout()
+            try:
+                yield server
+            except smtplib.SMTPServerDisconnected:
+                self._close(server)
+                raise
+            except Exception:
+                # A rejected recipient leaves the session usable; anything else might not
+                if not self._is_healthy(server):
+                    self._close(server)
+                else:
+                    self._checkin(server)
+                raise
+            else:
+                self._checkin(server)
+
+    def send_message(self, msg: MIMEMultipart):
+        try:
+            with self.connection() as server:
+                server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # The server may have dropped a pooled connection between checkout and send
+            with self.connection() as server:
+                server.send_message(msg)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for server, _ in idle:
+            self._close(server)
+
 class NotificationProvider(ABC):
     @abstractmethod
     async def send(self, recipient: str, subject: str, body: str, metadata: Dict[str, Any] = None) -> bool:
         pass
 
+    def close(self):
+        """Release pooled blocking transports held by the provider"""
+
+    async def aclose(self):
+        """Release pooled async transports; must run on the loop that used them"""
+        self.close()
+
 class EmailProvider(NotificationProvider):
+    def __init__(self):
+        self._pool: Optional[SMTPConnectionPool] = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def pool(self) -> SMTPConnectionPool:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = SMTPConnectionPool(
+                        settings.SMTP_HOST,
+                        settings.SMTP_PORT,
+                        settings.SMTP_USER,
+                        settings.SMTP_PASSWORD,
+                        max_size=settings.SMTP_POOL_SIZE,
+                        idle_timeout=settings.SMTP_POOL_IDLE_TIMEOUT,
+                        health_check_interval=settings.SMTP_POOL_HEALTH_CHECK_INTERVAL,
+                        timeout=settings.SMTP_TIMEOUT
+                    )
+        return self._pool
+
     async def send(self, recipient: str, subject: str, body: str, metadata: Dict[str, Any] = None) -> bool:
         try:
             if not settings.SMTP_HOST or not settings.SMTP_USER:
                 logger.warning("SMTP settings not configured, simulating email send")
                 return True
-            
+
             msg = MIMEMultipart()
             msg['From'] = settings.SMTP_USER
             msg['To'] = recipient
             msg['Subject'] = subject
-            
+
             msg.attach(MIMEText(body, 'html'))
-            
-            server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT)
-            server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.send_message(msg)
-            server.quit()
-            
+
+            # smtplib is blocking, so pooled sends run on the delivery loop's executor
+            await asyncio.get_running_loop().run_in_executor(None, self.pool.send_message, msg)
+
             logger.info(f"Email sent successfully to {recipient}")
             return True
-            
+
         except Exception as e:
             logger.error(f"Email send failed to {recipient}: {e}")
             return False
 
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+
 class SMSProvider(NotificationProvider):
     async def send(self, recipient: str, subject: str, body: str, metadata: Dict[str, Any] = None) -> bool:
         try:
             if not settings.TWILIO_ACCOUNT_SID or not settings.TWILIO_AUTH_TOKEN:
                 logger.warning("Twilio settings not configured, simulating SMS send")
                 return True
-            
+
             # Simulate Twilio SMS (replace with actual implementation)
             logger.info(f"SMS sent successfully to {recipient}: {body}")
             return True
-            
+
         except Exception as e:
             logger.error(f"SMS send failed to {recipient}: {e}")
             return False
@@ -62,16 +194,35 @@ class PushProvider(NotificationProvider):
             if not settings.FCM_SERVER_KEY:
                 logger.warning("FCM settings not configured, simulating push notification")
                 return True
-            
+
             # Simulate FCM push notification
             logger.info(f"Push notification sent successfully to {recipient}")
             return True
-            
+
         except Exception as e:
             logger.error(f"Push notification send failed to {recipient}: {e}")
             return False
 
 class WebhookProvider(NotificationProvider):
+    def __init__(self):
+        # Bound to the delivery engine's event loop on first use
+        self._client: Optional[httpx.AsyncClient] = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            # httpx keeps a keep-alive pool per origin and expires idle connections
+            self._client = httpx.AsyncClient(
+                timeout=settings.WEBHOOK_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.WEBHOOK_POOL_HOSTS * settings.WEBHOOK_POOL_SIZE,
+                    max_keepalive_connections=settings.WEBHOOK_POOL_HOSTS * settings.WEBHOOK_POOL_SIZE,
+                    keepalive_expiry=settings.WEBHOOK_POOL_IDLE_TIMEOUT
+                ),
+                headers={'Content-Type': 'application/json'}
+            )
+        return self._client
+
     async def send(self, recipient: str, subject: str, body: str, metadata: Dict[str, Any] = None) -> bool:
         try:
             payload = {
@@ -80,33 +231,57 @@ class WebhookProvider(NotificationProvider):
                 'metadata': metadata or {},
                 'timestamp': str(datetime.utcnow())
             }
-            
-            response = requests.post(
-                recipient, 
-                json=payload, 
-                timeout=30,
-                headers={'Content-Type': 'application/json'}
-            )
-            
+
+            response = await self.client.post(recipient, json=payload)
+
             success = response.status_code == 200
             if success:
                 logger.info(f"Webhook sent successfully to {recipient}")
             else:
                 logger.error(f"Webhook failed to {recipient}: {response.status_code}")
-            
+
             return success
-            
+
         except Exception as e:
             logger.error(f"Webhook send failed to {recipient}: {e}")
             return False
 
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+_providers: Dict[str, NotificationProvider] = {}
+_providers_pid: Optional[int] = None
+_providers_lock = threading.Lock()
+
 class NotificationServiceFactory:
     @staticmethod
-    def get_provider(notification_type: str) -> NotificationProvider:
-        providers = {
+    def _create_providers() -> Dict[str, NotificationProvider]:
+        return {
             'email': EmailProvider(),
             'sms': SMSProvider(),
             'push': PushProvider(),
             'webhook': WebhookProvider(),
         }
-        return providers.get(notification_type.lower())
\ No newline at end of file
+
+    @staticmethod
+    def get_provider(notification_type: str) -> NotificationProvider:
+        """Return the process-wide provider instance for a channel"""
+        global _providers, _providers_pid
+        # Pooled sockets must not be shared with forked worker children
+        if _providers_pid != os.getpid():
+            with _providers_lock:
+                if _providers_pid != os.getpid():
+                    _providers = NotificationServiceFactory._create_providers()
+                    _providers_pid = os.getpid()
+        return _providers.get(notification_type.lower())
+
+    @staticmethod
+    async def aclose_all():
+        """Close pooled connections of every provider in this process"""
+        global _providers, _providers_pid
+        with _providers_lock:
+            providers, _providers, _providers_pid = list(_providers.values()), {}, None
+        for provider in providers:
+            await provider.aclose()
@@ -0,0 +1,236 @@
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from sqlalchemy import Boolean, DateTime, Enum, Float, Integer, JSON, Table, column, delete, func, select, table, text
+from app.models.models import Event, EventOutbox, Notification, NotificationStatus
+from app.core.config import settings
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Tables partitioned by month on created_at (PostgreSQL; see alembic revision 0010)
+PARTITIONED_TABLES: Dict[str, Table] = {
+    "events": Event.__table__,
+    "notifications": Notification.__table__,
+}
+
+# Notifications share their event's created_at, so a month of them is archived before its events
+ARCHIVE_ORDER = ("notifications", "events")
+
+def month_start(value: datetime) -> datetime:
+    """First instant of the value's month, as a naive UTC datetime like the rest of the app"""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return datetime(value.year, value.month, 1)
+
+def add_months(month: datetime, count: int) -> datetime:
+    index = month.year * 12 + month.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(table_name: str, month: datetime) -> str:
+    return f"{table_name}_p{month:%Y%m}"
+
+def archive_path(directory: str, table_name: str, month: datetime, unique: bool = False) -> str:
+    """
+    Parquet file of one month of a table. With `unique`, an existing file is kept and a
+    numbered sibling returned instead, for months archived more than once.
+    """
+    base = os.path.join(directory, table_name, f"{table_name}_{month:%Y_%m}")
+    path = f"{base}.parquet"
+    part = 1
+    while unique and os.path.exists(path):
+        part += 1
+        path = f"{base}_{part}.parquet"
+    return path
+
+def _arrow_column(sa_type: Any):
+    """Arrow type and value converter of a column; enums are stored by name and JSON as text"""
+    import pyarrow as pa
+
+    if isinstance(sa_type, Enum):
+        return pa.string(), lambda value: value if value is None or isinstance(value, str) else value.name
+    if isinstance(sa_type, JSON):
+        return pa.string(), lambda value: None if value is None else json.dumps(value, default=str)
+    if isinstance(sa_type, DateTime):
+        return pa.timestamp("us", tz="UTC"), lambda value: (
+            value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+        )
+    if isinstance(sa_type, Boolean):
+        return pa.bool_(), None
+    if isinstance(sa_type, Integer):
+        return pa.int64(), None
+    if isinstance(sa_type, Float):
+        return pa.float64(), None
+    return pa.string(), None
+
+class PartitionService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    @property
+    def dialect(self) -> str:
+        return self.db.get_bind().dialect.name
+
+    def _relation_exists(self, name: str) -> bool:
+        return self.db.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+    def is_partitioned(self, table_name: str) -> bool:
+        if self.dialect != "postgresql":
+            return False
+        return bool(self.db.execute(
+            text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(:name)"), {"name": table_name}
+        ).scalar())
+
+    def ensure_partitions(self, months_ahead: int = None) -> List[str]:
+        """Create the monthly partitions of the current month and the next `months_ahead`"""
+        months_ahead = settings.PARTITION_PREMAKE_MONTHS if months_ahead is None else months_ahead
+        current = month_start(datetime.utcnow())
+        created = []
+        for table_name in PARTITIONED_TABLES:
+            if not self.is_partitioned(table_name):
+                continue
+            for offset in range(months_ahead + 1):
+                month = add_months(current, offset)
+                name = partition_name(table_name, month)
+                if self._relation_exists(name):
+                    continue
+                self.db.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF {table_name} "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') TO ('{add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+                ))
+                created.append(name)
+        self.db.commit()
+        return created
+
+    def partition_months(self, table_name: str) -> List[datetime]:
+        """
+        Months of a table's monthly partitions, including ones already detached by an
+        interrupted archive run
+        """
+        pattern = re.compile(rf"^{table_name}_p(\d{{4}})(\d{{2}})$")
+        names = self.db.execute(
+            text("SELECT relname FROM pg_class WHERE relkind = 'r' AND relname LIKE :prefix"),
+            {"prefix": f"{table_name}_p%"}
+        ).scalars()
+        months = []
+        for name in names:
+            match = pattern.match(name)
+            if match:
+                months.append(datetime(int(match.group(1)), int(match.group(2)), 1))
+        return sorted(months)
+
+    def archivable_months(self, table_name: str, cutoff: datetime) -> List[datetime]:
+        """Months of `table_name` that end on or before `cutoff` and still hold rows or partitions"""
+        if self.is_partitioned(table_name):
+            return [month for month in self.partition_months(table_name) if add_months(month, 1) <= cutoff]
+
+        model_table = PARTITIONED_TABLES[table_name]
+        oldest = self.db.execute(select(func.min(model_table.c.created_at))).scalar()
+        if oldest is None:
+            return []
+        months = []
+        month = month_start(oldest)
+        while add_months(month, 1) <= cutoff:
+            months.append(month)
+            month = add_months(month, 1)
+        return months
+
+    def export_parquet(self, query: Any, model_table: Table, path: str) -> int:
+        """
+        Stream a query over `model_table`'s columns into a zstd-compressed Parquet file,
+        ARCHIVE_BATCH_SIZE rows at a time. The file appears only once complete, and not
+        at all when the query returns no rows.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = [(c.name, *_arrow_column(c.type)) for c in model_table.c]
+        schema = pa.schema([(name, arrow_type) for name, arrow_type, _ in columns])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.partial"
+        rows = 0
+        result = self.db.execute(query.execution_options(yield_per=settings.ARCHIVE_BATCH_SIZE))
+        with pq.ParquetWriter(partial, schema, compression="zstd") as writer:
+            for batch in result.partitions():
+                data = {}
+                for position, (name, _, convert) in enumerate(columns):
+                    values = [row[position] for row in batch]
+                    data[name] = [convert(value) for value in values] if convert else values
+                writer.write_table(pa.Table.from_pydict(data, schema=schema))
+                rows += len(batch)
+        if not rows:
+            os.remove(partial)
+            return 0
+        os.replace(partial, path)
+        return rows
+
+    def in_flight(self, month: datetime) -> List[str]:
+        """
+        Work that still needs a month's rows, which archiving would drop silently: undelivered
+        notifications (a late fan-out or a retry keeps its event's created_at), unprocessed
+        events and unpublished outbox rows. Empty when the month can be archived.
+        """
+        in_month = lambda model: (model.created_at >= month) & (model.created_at < add_months(month, 1))
+        checks = {
+            "undelivered notifications": select(Notification.id).where(
+                in_month(Notification),
+                Notification.status.in_(
+                    [NotificationStatus.PENDING, NotificationStatus.PROCESSING, NotificationStatus.RETRYING]
+                )
+            ),
+            "unprocessed events": select(Event.id).where(in_month(Event), Event.processed == False),
+            "unpublished outbox rows": select(EventOutbox.id).join(Event, Event.id == EventOutbox.event_id).where(
+                in_month(Event), EventOutbox.published_at.is_(None)
+            ),
+        }
+        return [name for name, query in checks.items() if self.db.execute(query.limit(1)).first()]
+
+    def _purge_outbox(self, event_ids: Any):
+        """
+        Delete the outbox rows left for events about to be archived, whose events in_flight
+        found all published and processed. (Buffered digest items are kept; flush_digest
+        works without their event.)
+        """
+        self.db.execute(delete(EventOutbox).where(EventOutbox.event_id.in_(event_ids)))
+
+    def archive_month(self, table_name: str, month: datetime, directory: Optional[str] = None) -> int:
+        """
+        Move one month of a table to Parquet under `directory` and remove it from the database.
+        A partition is detached first, so exporting it holds no lock on the parent table;
+        unpartitioned tables (SQLite) are exported and deleted by created_at range instead.
+        """
+        directory = directory or settings.ARCHIVE_DIR
+        model_table = PARTITIONED_TABLES[table_name]
+
+        if self.is_partitioned(table_name):
+            name = partition_name(table_name, month)
+            attached = self.db.execute(
+                text("SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:name)"), {"name": name}
+            ).scalar()
+            if attached:
+                self.db.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {name}"))
+                self.db.commit()
+            partition = table(name, *[column(c.name, c.type) for c in model_table.c])
+            if table_name == "events":
+                self._purge_outbox(select(partition.c.id))
+            rows = self.export_parquet(
+                select(partition).order_by(partition.c.id), model_table, archive_path(directory, table_name, month)
+            )
+            self.db.execute(text(f"DROP TABLE {name}"))
+            self.db.commit()
+            return rows
+
+        in_month = (model_table.c.created_at >= month) & (model_table.c.created_at < add_months(month, 1))
+        if table_name == "events":
+            self._purge_outbox(select(model_table.c.id).where(in_month))
+        rows = self.export_parquet(
+            select(model_table).where(in_month).order_by(model_table.c.id),
+            model_table,
+            archive_path(directory, table_name, month, unique=True)
+        )
+        self.db.execute(delete(model_table).where(in_month))
+        self.db.commit()
+        return rows
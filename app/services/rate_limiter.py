@@ -0,0 +1,162 @@
+from typing import Dict, Tuple
+from urllib.parse import urlsplit
+from app.core.config import settings
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Refill and reserve tokens atomically, using the Redis clock so worker clock skew doesn't matter.
+# Returns {reserved, wait}: a reservation may drive the balance negative so concurrent
+# callers queue behind each other; waits longer than max_wait reserve nothing.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local requested = tonumber(ARGV[3])
+local max_wait = tonumber(ARGV[4])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local wait = math.max(0, (requested - tokens) / rate)
+local reserved = 0
+if wait <= max_wait then
+    tokens = tokens - requested
+    reserved = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return {reserved, tostring(wait)}
+"""
+
+# Give back tokens reserved for a send that did not happen, up to the bucket's capacity
+REFUND_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local returned = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate + returned)
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return 1
+"""
+
+class RateLimited(Exception):
+    """Raised when a send would have to wait longer than RATE_LIMIT_MAX_WAIT for tokens"""
+
+    def __init__(self, key: str, retry_after: float):
+        super().__init__(f"Rate limit reached for {key}, retry in {retry_after:.2f}s")
+        self.key = key
+        self.retry_after = retry_after
+
+class LocalRateLimiter:
+    """In-process token buckets; used for tests and as the fallback when Redis is unreachable"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    async def acquire(self, key: str, rate: float, capacity: float, max_wait: float,
+                      tokens: float = 1.0) -> Tuple[bool, float]:
+        with self._lock:
+            now = time.monotonic()
+            available, updated = self._buckets.get(key, (capacity, now))
+            available = min(capacity, available + (now - updated) * rate)
+            wait = max(0.0, (tokens - available) / rate)
+            reserved = wait <= max_wait
+            if reserved:
+                available -= tokens
+            self._buckets[key] = (available, now)
+            return reserved, wait
+
+    async def release(self, key: str, rate: float, capacity: float, tokens: float = 1.0):
+        with self._lock:
+            now = time.monotonic()
+            available, updated = self._buckets.get(key, (capacity, now))
+            self._buckets[key] = (min(capacity, available + (now - updated) * rate + tokens), now)
+
+class RedisRateLimiter:
+    """Token buckets shared by every worker through Redis"""
+
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.refund_script = self.client.register_script(REFUND_SCRIPT)
+        self.fallback = LocalRateLimiter()
+
+    async def acquire(self, key: str, rate: float, capacity: float, max_wait: float,
+                      tokens: float = 1.0) -> Tuple[bool, float]:
+        try:
+            reserved, wait = await self.script(
+                keys=[f"ratelimit:{key}"], args=[rate, capacity, tokens, max_wait]
+            )
+            return bool(reserved), float(wait)
+        except Exception as e:
+            logger.warning(f"Redis rate limiter unavailable, using local buckets: {e}")
+            return await self.fallback.acquire(key, rate, capacity, max_wait, tokens)
+
+    async def release(self, key: str, rate: float, capacity: float, tokens: float = 1.0):
+        try:
+            await self.refund_script(keys=[f"ratelimit:{key}"], args=[rate, capacity, tokens])
+        except Exception as e:
+            logger.warning(f"Redis rate limiter unavailable, using local buckets: {e}")
+            await self.fallback.release(key, rate, capacity, tokens)
+
+def channel_rate(notification_type: str) -> float:
+    return {
+        'email': settings.EMAIL_RATE_LIMIT,
+        'sms': settings.SMS_RATE_LIMIT,
+        'push': settings.PUSH_RATE_LIMIT,
+        'webhook': settings.WEBHOOK_RATE_LIMIT,
+    }.get(notification_type, 0.0)
+
+def bucket_limits(notification_type: str, recipient: str) -> Dict[str, float]:
+    """Bucket keys and rates (tokens per second) that a send must pass; rate 0 means unlimited"""
+    limits = {f"channel:{notification_type}": channel_rate(notification_type)}
+    if notification_type == 'webhook':
+        host = urlsplit(recipient).netloc.lower()
+        if host:
+            limits[f"webhook_host:{host}"] = settings.WEBHOOK_HOST_RATE_LIMIT
+    return {key: rate for key, rate in limits.items() if rate > 0}
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def throttle(self, notification_type: str, recipient: str):
+        """
+        Reserve a token from every bucket the send belongs to and wait until all are due.
+        Raises RateLimited instead when a wait would exceed RATE_LIMIT_MAX_WAIT, after
+        returning the tokens already reserved, so a throttled webhook host doesn't drain
+        the channel bucket of the other hosts.
+        """
+        reserved_buckets = []
+        longest_wait = 0.0
+        for key, rate in bucket_limits(notification_type, recipient).items():
+            capacity = max(rate * settings.RATE_LIMIT_BURST_SECONDS, 1.0)
+            reserved, wait = await self.backend.acquire(key, rate, capacity, settings.RATE_LIMIT_MAX_WAIT)
+            if not reserved:
+                for reserved_key, reserved_rate, reserved_capacity in reserved_buckets:
+                    await self.backend.release(reserved_key, reserved_rate, reserved_capacity)
+                raise RateLimited(key, wait)
+            reserved_buckets.append((key, rate, capacity))
+            longest_wait = max(longest_wait, wait)
+        if longest_wait > 0:
+            await asyncio.sleep(longest_wait)
+
+def create_rate_limiter() -> RateLimiter:
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        url = settings.RATE_LIMIT_REDIS_URL or settings.CELERY_RESULT_BACKEND
+        if url.startswith(("redis://", "rediss://", "unix://")):
+            return RateLimiter(RedisRateLimiter(url))
+        logger.warning(f"Rate limit backend URL {url} is not Redis, using local buckets")
+    return RateLimiter(LocalRateLimiter())
@@ -1,75 +1,340 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple, NamedTuple, Sequence
+from concurrent.futures import ProcessPoolExecutor
 from sqlalchemy.orm import Session
-from app.models.models import NotificationRule, EventType
+from sqlalchemy import func
+from app.models.models import NotificationRule, NotificationType, EventType
+from app.services.conditions import (
+    MISSING, AllOf, ColumnBatch, Comparison, Predicate, compile_conditions, is_hashable, resolve
+)
+from app.core.config import settings
+import math
+import multiprocessing
+import os
+import threading
+import time
 import logging
 
+import numpy as np
+
 logger = logging.getLogger(__name__)
 
+class RuleDefinition(NamedTuple):
+    """Picklable copy of the NotificationRule columns a CompiledRule is built from"""
+    id: int
+    name: str
+    event_type: EventType
+    notification_type: NotificationType
+    template_id: int
+    priority: int
+    coalesce_window_seconds: Optional[int]
+    coalesce_max_count: Optional[int]
+    digest_template_id: Optional[int]
+    conditions: Any
+
+    @classmethod
+    def from_rule(cls, rule: Any) -> "RuleDefinition":
+        return cls(*(getattr(rule, field) for field in cls._fields))
+
+class CompiledRule:
+    """Detached, pre-compiled snapshot of an active NotificationRule"""
+
+    __slots__ = (
+        "id", "name", "event_type", "notification_type", "template_id",
+        "priority", "coalesce_window_seconds", "coalesce_max_count", "digest_template_id",
+        "position", "condition", "predicates", "index_field", "index_values", "index_predicate",
+    )
+
+    def __init__(self, rule: RuleDefinition, position: int):
+        self.id = rule.id
+        self.name = rule.name
+        self.event_type = rule.event_type
+        self.notification_type = rule.notification_type
+        self.template_id = rule.template_id
+        self.priority = rule.priority
+        self.coalesce_window_seconds = rule.coalesce_window_seconds
+        self.coalesce_max_count = rule.coalesce_max_count
+        self.digest_template_id = rule.digest_template_id
+        self.position = position
+        self.condition = compile_conditions(rule.conditions)
+        self.predicates: List[Predicate] = []
+        self.index_field: Optional[str] = None
+        self.index_values: Tuple[Any, ...] = ()
+        self.index_predicate: Optional[Predicate] = None
+        self._split_index_term()
+
+    def _split_index_term(self):
+        """Serve the first top-level equality-style test from the hash index, the rest as predicates"""
+        terms = self.condition.children if isinstance(self.condition, AllOf) else [self.condition]
+        for term in terms:
+            if self.index_field is None and isinstance(term, Comparison):
+                values = term.index_values()
+                if values is not None:
+                    self.index_field, self.index_values = term.path, values
+                    self.index_predicate = term.predicate
+                    continue
+            self.predicates.append(term.predicate)
+
+    def matches(self, event_data: Dict[str, Any]) -> bool:
+        for predicate in self.predicates:
+            if not predicate(event_data):
+                return False
+        return True
+
+class _EventTypeIndex:
+    def __init__(self, rules: List[CompiledRule]):
+        self.rules = rules
+        self.unindexed: List[CompiledRule] = []
+        self.by_field: Dict[str, List[CompiledRule]] = {}
+        self.buckets: Dict[str, Dict[Any, List[CompiledRule]]] = {}
+
+        for rule in rules:
+            if rule.index_field is None:
+                self.unindexed.append(rule)
+                continue
+            self.by_field.setdefault(rule.index_field, []).append(rule)
+            buckets = self.buckets.setdefault(rule.index_field, {})
+            for value in rule.index_values:
+                bucket = buckets.setdefault(value, [])
+                if not bucket or bucket[-1] is not rule:
+                    bucket.append(rule)
+
+    def candidates(self, event_data: Dict[str, Any]) -> List[CompiledRule]:
+        if not self.by_field:
+            return self.unindexed
+
+        candidates = list(self.unindexed)
+        for field, buckets in self.buckets.items():
+            event_value = resolve(event_data, field)
+            if event_value is MISSING:
+                # A missing field fails the key condition of every rule keyed on it
+                continue
+            if is_hashable(event_value):
+                candidates.extend(buckets.get(event_value, ()))
+            else:
+                candidates.extend(
+                    rule for rule in self.by_field[field]
+                    if rule.index_predicate(event_data)
+                )
+        candidates.sort(key=lambda rule: rule.position)
+        return candidates
+
+    def match(self, event_data: Dict[str, Any]) -> List[CompiledRule]:
+        return [rule for rule in self.candidates(event_data) if rule.matches(event_data)]
+
+class RuleIndex:
+    """Active rules grouped by event type with conditions compiled to predicates"""
+
+    def __init__(self, rules: Sequence[Any]):
+        # Kept so rule pool processes can compile an identical copy
+        self.definitions = [RuleDefinition.from_rule(rule) for rule in rules]
+        grouped: Dict[EventType, List[CompiledRule]] = {}
+        for definition in self.definitions:
+            compiled = grouped.setdefault(definition.event_type, [])
+            compiled.append(CompiledRule(definition, len(compiled)))
+        self.by_event_type = {
+            event_type: _EventTypeIndex(compiled) for event_type, compiled in grouped.items()
+        }
+        self.by_id = {rule.id: rule for compiled in grouped.values() for rule in compiled}
+        self.size = len(self.definitions)
+
+    def match(self, event_type: EventType, event_data: Dict[str, Any]) -> List[CompiledRule]:
+        index = self.by_event_type.get(event_type)
+        if index is None:
+            return []
+        return index.match(event_data)
+
+    def match_many(self, events: Sequence[Tuple[EventType, Dict[str, Any]]]) -> List[List[CompiledRule]]:
+        """
+        Matching rules of every event, same as `match`. From RULES_VECTORIZE_MIN_BATCH events,
+        each rule's condition plan runs once over the columns of all events of its type.
+        """
+        if len(events) < settings.RULES_VECTORIZE_MIN_BATCH:
+            return [self.match(event_type, event_data) for event_type, event_data in events]
+
+        positions: Dict[EventType, List[int]] = {}
+        for position, (event_type, _) in enumerate(events):
+            positions.setdefault(event_type, []).append(position)
+
+        matches: List[List[CompiledRule]] = [[] for _ in events]
+        for event_type, rows in positions.items():
+            index = self.by_event_type.get(event_type)
+            if index is None:
+                continue
+            batch = ColumnBatch([events[row][1] for row in rows])
+            # Rules in position order, so each event's list comes out in match order
+            for rule in index.rules:
+                for row in np.flatnonzero(rule.condition.mask(batch)):
+                    matches[rows[row]].append(rule)
+        return matches
+
+# Rule index of a RulePool process, compiled once by the pool initializer
+_worker_index: Optional[RuleIndex] = None
+
+def _init_pool_worker(definitions: List[RuleDefinition]):
+    global _worker_index
+    _worker_index = RuleIndex(definitions)
+
+def _match_chunk(events: List[Tuple[EventType, Dict[str, Any]]]) -> List[List[int]]:
+    return [[rule.id for rule in rules] for rules in _worker_index.match_many(events)]
+
+class RulePool:
+    """
+    Process pool whose workers each hold a compiled copy of one RuleIndex, so CPU-bound
+    matching of large event batches runs on every core. Workers are spawned rather than
+    forked, since the calling process may run threads (the delivery loop).
+    """
+
+    def __init__(self, index: RuleIndex, processes: int):
+        self.index = index
+        self.processes = processes
+        self.executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_pool_worker,
+            initargs=(index.definitions,)
+        )
+
+    def match_many(
+        self,
+        events: Sequence[Tuple[EventType, Dict[str, Any]]],
+        chunk_size: int = None
+    ) -> List[List[CompiledRule]]:
+        """Matching rules of every event, in input order and rule order, same as RuleIndex.match"""
+        if not chunk_size:
+            # One chunk per process, but big enough to run columnar and at most RULES_EVAL_CHUNK_SIZE
+            chunk_size = min(
+                max(math.ceil(len(events) / self.processes), settings.RULES_VECTORIZE_MIN_BATCH),
+                settings.RULES_EVAL_CHUNK_SIZE
+            )
+        chunks = [list(events[start:start + chunk_size]) for start in range(0, len(events), chunk_size)]
+        matches = []
+        for chunk_ids in self.executor.map(_match_chunk, chunks):
+            matches.extend([self.index.by_id[rule_id] for rule_id in rule_ids] for rule_ids in chunk_ids)
+        return matches
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def rule_pool_processes() -> int:
+    """
+    Processes for batch rule matching; 0 when pools are disabled or unavailable. Daemonic
+    processes (Celery prefork children) cannot have children, so only solo or thread pool
+    workers use one.
+    """
+    if multiprocessing.current_process().daemon:
+        return 0
+    processes = settings.RULES_EVAL_PROCESSES or os.cpu_count() or 1
+    return processes if processes > 1 else 0
+
+_pool_lock = threading.Lock()
+_rule_pool: Optional[RulePool] = None
+
+_cache_lock = threading.Lock()
+_rule_index: Optional[RuleIndex] = None
+_rule_signature: Optional[Tuple[Any, ...]] = None
+_checked_at = 0.0
+
+def invalidate_rule_cache():
+    """Force the next lookup in this process to rebuild the rule index"""
+    global _rule_index, _rule_signature, _checked_at
+    with _cache_lock:
+        _rule_index = None
+        _rule_signature = None
+        _checked_at = 0.0
+
+def get_rule_pool(index: RuleIndex) -> Optional[RulePool]:
+    """This process's rule pool for `index`, replacing the pool of an older index"""
+    global _rule_pool
+    processes = rule_pool_processes()
+    if not processes:
+        return None
+    with _pool_lock:
+        if _rule_pool is None or _rule_pool.index is not index:
+            if _rule_pool is not None:
+                _rule_pool.shutdown()
+            _rule_pool = RulePool(index, processes)
+            logger.info(f"Started rule pool with {processes} processes for {index.size} rules")
+        return _rule_pool
+
+def discard_rule_pool(pool: RulePool):
+    """Shut down `pool` and forget it, unless another thread replaced it already"""
+    global _rule_pool
+    with _pool_lock:
+        if _rule_pool is pool:
+            _rule_pool = None
+    pool.shutdown()
+
 class RulesEngine:
     def __init__(self, db: Session):
         self.db = db
-    
+
     def evaluate_conditions(self, conditions: Dict[str, Any], event_data: Dict[str, Any]) -> bool:
         """
-        Evaluate rule conditions against event data
-        Supports: equals, not_equals, greater_than, less_than, contains, in_list, exists
+        Evaluate rule conditions against event data. See compile_conditions for the
+        language; a field missing from the event fails every test but `not_exists`.
         """
-        if not conditions:
-            return True
-            
-        try:
-            for field, condition in conditions.items():
-                if not isinstance(condition, dict):
-                    continue
-                    
-                operator = condition.get("operator")
-                value = condition.get("value")
-                
-                # Check if field exists in event data
-                if field not in event_data:
-                    if operator == "exists":
-                        return False
-                    continue
-                
-                event_value = event_data[field]
-                
-                # Evaluate conditions
-                if operator == "equals" and event_value != value:
-                    return False
-                elif operator == "not_equals" and event_value == value:
-                    return False
-                elif operator == "greater_than" and float(event_value) <= float(value):
-                    return False
-                elif operator == "less_than" and float(event_value) >= float(value):
-                    return False
-                elif operator == "contains" and value not in str(event_value):
-                    return False
-                elif operator == "in_list" and event_value not in value:
-                    return False
-                elif operator == "exists" and field not in event_data:
-                    return False
-            
-            return True
-        except Exception as e:
-            logger.error(f"Error evaluating conditions: {e}")
-            return False
-    
-    def get_matching_rules(self, event_type: EventType, event_data: Dict[str, Any]) -> List[NotificationRule]:
+        return compile_conditions(conditions).predicate(event_data)
+
+    def _rules_signature(self) -> Tuple[Any, ...]:
+        """Cheap fingerprint that changes on any rule create, update or delete"""
+        return tuple(self.db.query(
+            func.count(NotificationRule.id),
+            func.max(NotificationRule.id),
+            func.max(NotificationRule.updated_at)
+        ).one())
+
+    def load_rule_index(self) -> RuleIndex:
+        rules = self.db.query(NotificationRule).filter(
+            NotificationRule.is_active == True
+        ).order_by(NotificationRule.priority.desc(), NotificationRule.id).all()
+        return RuleIndex(rules)
+
+    def get_rule_index(self) -> RuleIndex:
+        """Return the process-wide rule index, rebuilding it when the rules table changed"""
+        global _rule_index, _rule_signature, _checked_at
+        now = time.monotonic()
+        index = _rule_index
+        if index is not None and now - _checked_at < settings.RULES_CACHE_CHECK_INTERVAL:
+            return index
+
+        with _cache_lock:
+            signature = self._rules_signature()
+            if _rule_index is None or signature != _rule_signature:
+                _rule_index = self.load_rule_index()
+                _rule_signature = signature
+                logger.info(f"Compiled rule index with {_rule_index.size} active rules")
+            _checked_at = now
+            return _rule_index
+
+    def get_matching_rules(self, event_type: EventType, event_data: Dict[str, Any]) -> List[CompiledRule]:
         """Get all active rules that match the event"""
         try:
-            rules = self.db.query(NotificationRule).filter(
-                NotificationRule.event_type == event_type,
-                NotificationRule.is_active == True
-            ).order_by(NotificationRule.priority.desc()).all()
-            
-            matching_rules = []
-            for rule in rules:
-                if self.evaluate_conditions(rule.conditions, event_data):
-                    matching_rules.append(rule)
-            
+            matching_rules = self.get_rule_index().match(event_type, event_data)
+
             logger.info(f"Found {len(matching_rules)} matching rules for event {event_type}")
             return matching_rules
-            
+
         except Exception as e:
             logger.error(f"Error getting matching rules: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def get_matching_rules_batch(
+        self,
+        events: Sequence[Tuple[EventType, Dict[str, Any]]]
+    ) -> List[List[CompiledRule]]:
+        """
+        Matching rules for each (event_type, event_data), in input order. Batches of at
+        least RULES_EVAL_MIN_BATCH events are split over the rule pool processes; results
+        are identical to calling get_matching_rules on each event.
+        """
+        index = self.get_rule_index()
+        if len(events) >= settings.RULES_EVAL_MIN_BATCH:
+            pool = get_rule_pool(index)
+            if pool is not None:
+                try:
+                    return pool.match_many(events)
+                except Exception as e:
+                    logger.error(f"Rule pool failed, matching inline: {e}")
+                    # E.g. BrokenProcessPool after a process was killed; the next batch starts a new pool
+                    discard_rule_pool(pool)
+        return index.match_many(events)
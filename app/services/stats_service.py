@@ -0,0 +1,79 @@
+from typing import Dict, Any, Optional, Tuple
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from app.db.database import upsert_insert
+from app.models.models import NotificationHourlyStats, NotificationType
+from app.core.config import settings
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ("total_created", "total_sent", "total_failed", "total_retries", "delivery_time_total")
+
+def hour_bucket(moment: Optional[datetime] = None) -> datetime:
+    """Truncate a timestamp to its UTC hour"""
+    moment = moment or datetime.utcnow()
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+def seconds_since(start: Optional[datetime], end: datetime) -> float:
+    if start is None:
+        return 0.0
+    if start.tzinfo is not None:
+        start = start.astimezone(timezone.utc).replace(tzinfo=None)
+    return max((end - start).total_seconds(), 0.0)
+
+class StatsService:
+    """
+    Accumulates per-hour, per-type counter increments and upserts them in one
+    statement, inside the caller's transaction, so rollups move with the rows they count.
+    Each flush picks one of STATS_COUNTER_SLOTS rows per counter, so concurrent
+    transactions rarely wait on each other; readers sum over the slots.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+        self._deltas: Dict[Tuple[datetime, NotificationType], Dict[str, Any]] = {}
+
+    def record(self, notification_type: NotificationType, at: Optional[datetime] = None, **increments):
+        key = (hour_bucket(at), notification_type)
+        delta = self._deltas.setdefault(key, dict.fromkeys(COUNTERS, 0))
+        for counter, amount in increments.items():
+            delta[counter] += amount
+
+    def record_created(self, notification_type: NotificationType, count: int = 1):
+        self.record(notification_type, total_created=count)
+
+    def record_sent(self, notification_type: NotificationType, created_at: Optional[datetime], sent_at: datetime):
+        self.record(notification_type, at=sent_at, total_sent=1,
+                    delivery_time_total=seconds_since(created_at, sent_at))
+
+    def record_failed(self, notification_type: NotificationType, permanently: bool):
+        if permanently:
+            self.record(notification_type, total_failed=1)
+        else:
+            self.record(notification_type, total_retries=1)
+
+    def flush(self):
+        """Upsert accumulated increments; the caller commits, as soon as possible"""
+        if not self._deltas:
+            return
+
+        stmt = upsert_insert(self.db, NotificationHourlyStats)
+        table = NotificationHourlyStats.__table__
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.hour, table.c.notification_type, table.c.slot],
+            set_={counter: table.c[counter] + stmt.excluded[counter] for counter in COUNTERS}
+        )
+        slot = random.randrange(settings.STATS_COUNTER_SLOTS)
+        # Rows locked in one order by every transaction, so two of them can't deadlock
+        rows = [
+            {"hour": hour, "notification_type": notification_type, "slot": slot, **delta}
+            for (hour, notification_type), delta in sorted(
+                self._deltas.items(), key=lambda item: (item[0][0], item[0][1].name)
+            )
+        ]
+        self.db.execute(stmt, rows)
+        self._deltas.clear()
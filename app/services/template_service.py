@@ -0,0 +1,120 @@
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from sqlalchemy.orm import Session
+from jinja2 import Environment, Template
+from app.models.models import NotificationTemplate, NotificationType
+from app.core.config import settings
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Email bodies are HTML, so event data is escaped there; other channels are plain text
+_html_env = Environment(autoescape=True)
+_text_env = Environment(autoescape=False)
+
+class CompiledTemplate:
+    """Subject and body of a NotificationTemplate compiled once"""
+
+    __slots__ = ("id", "version", "notification_type", "subject", "body")
+
+    def __init__(self, template: NotificationTemplate):
+        env = _html_env if template.notification_type == NotificationType.EMAIL else _text_env
+        self.id = template.id
+        self.version = template.version
+        self.notification_type = template.notification_type
+        # Subjects are never HTML
+        self.subject: Optional[Template] = _text_env.from_string(template.subject) if template.subject else None
+        self.body: Template = env.from_string(template.body)
+
+    def render(self, context: Dict[str, Any]) -> Tuple[Optional[str], str]:
+        subject = self.subject.render(context) if self.subject is not None else None
+        return subject, self.body.render(context)
+
+class TemplateCache:
+    """Thread-safe LRU of compiled templates keyed by (template_id, version)"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._templates: "OrderedDict[Tuple[int, int], CompiledTemplate]" = OrderedDict()
+        # template_id -> (version, monotonic time the version was last confirmed)
+        self._versions: Dict[int, Tuple[int, float]] = {}
+
+    def get(self, template_id: int, version: int) -> Optional[CompiledTemplate]:
+        with self._lock:
+            compiled = self._templates.get((template_id, version))
+            if compiled is not None:
+                self._templates.move_to_end((template_id, version))
+            return compiled
+
+    def put(self, compiled: CompiledTemplate):
+        key = (compiled.id, compiled.version)
+        with self._lock:
+            self._templates[key] = compiled
+            self._templates.move_to_end(key)
+            self._versions[compiled.id] = (compiled.version, time.monotonic())
+            while len(self._templates) > self.max_size:
+                (evicted_id, evicted_version), _ = self._templates.popitem(last=False)
+                if self._versions.get(evicted_id, (None,))[0] == evicted_version:
+                    del self._versions[evicted_id]
+
+    def current_version(self, template_id: int, ttl: float) -> Optional[int]:
+        """Last known version of a template if it was confirmed within ttl seconds"""
+        with self._lock:
+            entry = self._versions.get(template_id)
+        if entry is None or time.monotonic() - entry[1] >= ttl:
+            return None
+        return entry[0]
+
+    def confirm_version(self, template_id: int, version: int):
+        with self._lock:
+            self._versions[template_id] = (version, time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+            self._versions.clear()
+
+template_cache = TemplateCache(settings.TEMPLATE_CACHE_SIZE)
+
+class TemplateService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_compiled_template(self, template_id: int) -> CompiledTemplate:
+        """Return the compiled template, hitting the database only when the cached version may be stale"""
+        version = template_cache.current_version(template_id, settings.TEMPLATE_CACHE_TTL)
+        if version is None:
+            row = self.db.query(NotificationTemplate.version).filter(
+                NotificationTemplate.id == template_id
+            ).first()
+            if not row:
+                raise ValueError(f"Template {template_id} not found")
+            version = row.version
+            template_cache.confirm_version(template_id, version)
+
+        compiled = template_cache.get(template_id, version)
+        if compiled is not None:
+            return compiled
+
+        template = self.db.query(NotificationTemplate).filter(
+            NotificationTemplate.id == template_id
+        ).first()
+        if not template:
+            raise ValueError(f"Template {template_id} not found")
+
+        compiled = CompiledTemplate(template)
+        template_cache.put(compiled)
+        logger.debug(f"Compiled template {template_id} version {compiled.version}")
+        return compiled
+
+    def render_template(self, template_id: int, context: Dict[str, Any]) -> Tuple[Optional[str], str]:
+        """Render a template's subject and body against event data"""
+        return self.get_compiled_template(template_id).render(context)
+
+    def render_many(self, template_id: int, contexts: List[Dict[str, Any]]) -> List[Tuple[Optional[str], str]]:
+        """Render one template against many contexts with a single lookup"""
+        compiled = self.get_compiled_template(template_id)
+        return [compiled.render(context) for context in contexts]
@@ -1,6 +1,6 @@
 from app.workers.celery_app import celery_app
 from app.db.database import SessionLocal
-from app.models.models import Notification, NotificationStats, NotificationStatus
+from app.models.models import NotificationHourlyStats, NotificationStats
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime, timedelta
@@ -17,36 +17,44 @@ def update_daily_stats():
     db = get_db()
     try:
         today = datetime.utcnow().date()
+        day_start = datetime.combine(today, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
         
-        # Get stats for each notification type
+        # Roll the day's hourly counters up per notification type
         stats_query = db.query(
-            Notification.notification_type,
-            func.count(Notification.id).label('total'),
-            func.sum(func.case([(Notification.status == NotificationStatus.SENT, 1)], else_=0)).label('sent'),
-            func.sum(func.case([(Notification.status == NotificationStatus.FAILED, 1)], else_=0)).label('failed'),
-            func.sum(Notification.retry_count).label('retries')
+            NotificationHourlyStats.notification_type,
+            func.sum(NotificationHourlyStats.total_sent).label('sent'),
+            func.sum(NotificationHourlyStats.total_failed).label('failed'),
+            func.sum(NotificationHourlyStats.total_retries).label('retries'),
+            func.sum(NotificationHourlyStats.delivery_time_total).label('delivery_time')
         ).filter(
-            func.date(Notification.created_at) == today
-        ).group_by(Notification.notification_type).all()
+            NotificationHourlyStats.hour >= day_start,
+            NotificationHourlyStats.hour < day_end
+        ).group_by(NotificationHourlyStats.notification_type).all()
         
         for stat in stats_query:
             # Update or create daily stats
             existing_stat = db.query(NotificationStats).filter(
-                func.date(NotificationStats.date) == today,
+                NotificationStats.date >= day_start,
+                NotificationStats.date < day_end,
                 NotificationStats.notification_type == stat.notification_type
             ).first()
             
+            avg_delivery_time = (stat.delivery_time or 0.0) / stat.sent if stat.sent else 0.0
+            
             if existing_stat:
                 existing_stat.total_sent = stat.sent or 0
                 existing_stat.total_failed = stat.failed or 0
                 existing_stat.total_retries = stat.retries or 0
+                existing_stat.avg_delivery_time = avg_delivery_time
             else:
                 new_stat = NotificationStats(
-                    date=datetime.combine(today, datetime.min.time()),
+                    date=day_start,
                     notification_type=stat.notification_type,
                     total_sent=stat.sent or 0,
                     total_failed=stat.failed or 0,
-                    total_retries=stat.retries or 0
+                    total_retries=stat.retries or 0,
+                    avg_delivery_time=avg_delivery_time
                 )
                 db.add(new_stat)
         
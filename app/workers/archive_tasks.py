@@ -0,0 +1,57 @@
+from app.workers.celery_app import celery_app
+from app.db.database import SessionLocal
+from app.services.partition_service import ARCHIVE_ORDER, PartitionService, month_start
+from app.core.config import settings
+from sqlalchemy.orm import Session
+from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+def get_db() -> Session:
+    return SessionLocal()
+
+@celery_app.task
+def maintain_partitions():
+    """Create the monthly events and notifications partitions PARTITION_PREMAKE_MONTHS ahead"""
+    db = get_db()
+    try:
+        created = PartitionService(db).ensure_partitions()
+        if created:
+            logger.info(f"Created partitions {', '.join(created)}")
+    except Exception as e:
+        logger.error(f"Error creating partitions: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+@celery_app.task
+def archive_old_data():
+    """
+    Export every month of notifications and events that ended more than ARCHIVE_AFTER_DAYS
+    ago to Parquet under ARCHIVE_DIR, then drop it from the database. Months that still
+    have work in flight are left for a later run.
+    """
+    db = get_db()
+    try:
+        service = PartitionService(db)
+        cutoff = month_start(datetime.utcnow() - timedelta(days=settings.ARCHIVE_AFTER_DAYS))
+        in_flight = {}
+        for table_name in ARCHIVE_ORDER:
+            for month in service.archivable_months(table_name, cutoff):
+                if month not in in_flight:
+                    in_flight[month] = service.in_flight(month)
+                    db.rollback()
+                    if in_flight[month]:
+                        logger.warning(
+                            f"Not archiving {month:%Y-%m} yet, it still has {', '.join(in_flight[month])}"
+                        )
+                if in_flight[month]:
+                    continue
+                rows = service.archive_month(table_name, month)
+                logger.info(f"Archived {rows} {table_name} rows of {month:%Y-%m}")
+    except Exception as e:
+        logger.error(f"Error archiving old data: {e}")
+        db.rollback()
+    finally:
+        db.close()
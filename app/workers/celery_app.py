@@ -1,5 +1,7 @@
 from celery import Celery
+from celery.signals import worker_init
 from app.core.config import settings
+from app.core.metrics import start_exporter
 
 celery_app = Celery(
     "notification_orchestrator",
@@ -8,7 +10,9 @@ celery_app = Celery(
     include=[
         "app.workers.notification_tasks",
         "app.workers.event_tasks",
-        "app.workers.analytics_tasks"
+        "app.workers.outbox_tasks",
+        "app.workers.analytics_tasks",
+        "app.workers.archive_tasks"
     ]
 )
 
@@ -29,22 +33,61 @@ celery_app.conf.update(
 # Retry configuration
 celery_app.conf.task_routes = {
     "app.workers.notification_tasks.send_notification": {"queue": "notifications"},
+    "app.workers.notification_tasks.send_notification_batch": {"queue": "notifications"},
     "app.workers.event_tasks.process_event": {"queue": "events"},
+    "app.workers.event_tasks.process_event_batch": {"queue": "events"},
+    "app.workers.event_tasks.fan_out_audience": {"queue": "events_bulk"},
+    "app.workers.event_tasks.flush_digest": {"queue": "events"},
+    "app.workers.event_tasks.flush_due_digests": {"queue": "events"},
+    "app.workers.outbox_tasks.relay_event_outbox": {"queue": "events"},
     "app.workers.analytics_tasks.update_stats": {"queue": "analytics"},
 }
 
 # Beat schedule for periodic tasks
 celery_app.conf.beat_schedule = {
+    "relay-event-outbox": {
+        "task": "app.workers.outbox_tasks.relay_event_outbox",
+        "schedule": 10.0,  # Safety net; the dedicated relay process publishes within OUTBOX_RELAY_POLL_INTERVAL
+    },
+    "requeue-unprocessed-events": {
+        "task": "app.workers.outbox_tasks.requeue_unprocessed_events",
+        "schedule": 60.0,  # Every minute; recovers events whose batch was lost or gave up
+    },
+    "purge-event-outbox": {
+        "task": "app.workers.outbox_tasks.purge_event_outbox",
+        "schedule": 3600.0,  # Every hour
+    },
+    "flush-due-digests": {
+        "task": "app.workers.event_tasks.flush_due_digests",
+        "schedule": settings.DIGEST_FLUSH_INTERVAL,
+    },
     "process-pending-notifications": {
         "task": "app.workers.notification_tasks.process_pending_notifications",
-        "schedule": 60.0,  # Every minute
+        "schedule": 60.0,  # Every minute; sweeps stragglers missed by immediate dispatch
     },
-    "retry-failed-notifications": {
-        "task": "app.workers.notification_tasks.retry_failed_notifications",
-        "schedule": 300.0,  # Every 5 minutes
+    "release-due-retries": {
+        "task": "app.workers.notification_tasks.release_due_retries",
+        "schedule": settings.RETRY_RELEASE_INTERVAL,
+    },
+    "requeue-expired-claims": {
+        "task": "app.workers.notification_tasks.requeue_expired_claims",
+        "schedule": 60.0,  # Every minute; recovers batches whose worker died after claiming
+    },
+    "maintain-partitions": {
+        "task": "app.workers.archive_tasks.maintain_partitions",
+        "schedule": 86400.0,  # Daily
+    },
+    "archive-old-data": {
+        "task": "app.workers.archive_tasks.archive_old_data",
+        "schedule": 86400.0,  # Daily
     },
     "update-daily-stats": {
         "task": "app.workers.analytics_tasks.update_daily_stats",
         "schedule": 3600.0,  # Every hour
     },
-}
\ No newline at end of file
+}
+@worker_init.connect
+def start_worker_exporter(**kwargs):
+    # Runs in the worker's main process. Prefork children's samples are only included through
+    # a PROMETHEUS_MULTIPROC_DIR of this worker alone, which scripts/run_workers.py sets up
+    start_exporter(settings.WORKER_METRICS_PORT)
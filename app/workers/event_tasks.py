@@ -1,12 +1,24 @@
 from app.workers.celery_app import celery_app
 from app.db.database import SessionLocal
-from app.models.models import Event, Notification, NotificationStatus
+from app.models.models import Event, Notification, NotificationRule, NotificationStatus
+from app.db.database import upsert_insert
+from app.services.audience_service import AudienceService, compile_segment
+from app.services.digest_service import DigestService, digest_context, digest_limit
 from app.services.rules_engine import RulesEngine
 from app.services.template_service import TemplateService
+from app.services.stats_service import StatsService
+from app.workers.notification_tasks import dispatch_by_priority
+from app.workers.lanes import notification_priority
+from app.core.config import settings
+from app.core.metrics import NOTIFICATIONS_COALESCED, NOTIFICATIONS_CREATED, STAGE_SECONDS, epoch, timed
 from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
+from types import SimpleNamespace
 import logging
-from typing import Dict, Any
+import time
+from typing import Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -25,34 +37,117 @@ def extract_recipient(event_data: Dict[str, Any], notification_type: str) -> str
         return event_data.get("webhook_url") or event_data.get("callback_url")
     return None
 
-@celery_app.task
-def process_event(event_id: int):
-    """Process a single event and trigger notifications"""
+def notification_row(
+    rule: Any,
+    event: Any,
+    recipient: str,
+    subject: str,
+    body: str,
+    scheduled_at: datetime,
+    audience: bool = False
+) -> Dict[str, Any]:
+    """
+    Column values of a new PENDING notification produced by `rule` for `event`. The
+    metadata carries when the event was accepted (Unix seconds), for end-to-end latency
+    metrics at delivery.
+    """
+    return {
+        'rule_id': rule.id,
+        'event_id': event.id,
+        'recipient': recipient,
+        'notification_type': rule.notification_type,
+        'subject': subject,
+        'body': body,
+        'status': NotificationStatus.PENDING,
+        'priority': notification_priority(rule.priority, event.event_type, audience),
+        'max_retries': settings.MAX_RETRY_ATTEMPTS,
+        'scheduled_at': scheduled_at,
+        # Same partition as the event, and the same dedup key when the event is processed again
+        'created_at': event.created_at,
+        'notification_metadata': {
+            'event_id': event.id,
+            'rule_id': rule.id,
+            'event_type': event.event_type.value,
+            'event_received_at': epoch(event.created_at)
+        }
+    }
+
+def insert_notifications(db: Session, rows: List[Dict[str, Any]]) -> list:
+    """
+    Write notification rows in one multi-row INSERT and record their created counts.
+    Rows that already exist for the same (event_id, rule_id, recipient) are skipped;
+    the (id, priority) of the rows actually inserted are returned. The rollup rows stay
+    locked until the caller commits, so it commits right after.
+    """
+    if not rows:
+        return []
+    
+    stmt = upsert_insert(db, Notification).on_conflict_do_nothing(
+        index_elements=["event_id", "rule_id", "recipient", "created_at"]
+    ).returning(Notification.id, Notification.notification_type, Notification.priority)
+    inserted = db.execute(stmt, rows).all()
+    
+    stats = StatsService(db)
+    for row in inserted:
+        stats.record_created(row.notification_type)
+    stats.flush()
+    return inserted
+
+def record_created(event_type: str, inserted: list):
+    for row in inserted:
+        NOTIFICATIONS_CREATED.labels(event_type=event_type, channel=row.notification_type.value).inc()
+
+def run_event(event_id: int, matching_rules: Optional[list] = None) -> bool:
+    """
+    Process a single event and trigger notifications. `matching_rules` may hold the
+    event's rules when they were already matched as part of a batch.
+    """
     db = get_db()
     try:
-        event = db.query(Event).filter(Event.id == event_id).first()
+        # Claim the event. The conditional UPDATE holds the row lock until commit, so a
+        # concurrent worker waits and then finds it processed, or claims it after a rollback here
+        event = db.execute(
+            update(Event)
+            .where(Event.id == event_id, Event.processed == False)
+            .values(processed=True)
+            .returning(Event.id, Event.event_type, Event.event_data, Event.created_at)
+        ).first()
         
         if not event:
-            logger.error(f"Event {event_id} not found")
-            return False
-        
-        if event.processed:
+            if db.get(Event, event_id) is None:
+                logger.error(f"Event {event_id} not found")
+                return False
             logger.warning(f"Event {event_id} already processed")
             return True
         
+        now = datetime.utcnow()
+        started = time.perf_counter()
+        event_type = event.event_type.value
+        
         # Initialize services
         rules_engine = RulesEngine(db)
         template_service = TemplateService(db)
         
         # Get matching rules
-        matching_rules = rules_engine.get_matching_rules(
-            event.event_type, 
-            event.event_data
-        )
+        if matching_rules is None:
+            with timed(STAGE_SECONDS, stage="rule_match", event_type=event_type):
+                matching_rules = rules_engine.get_matching_rules(
+                    event.event_type, 
+                    event.event_data
+                )
         
-        notifications_created = 0
+        rows = []
+        # Coalescing rules buffer the event for a per-recipient digest instead
+        digest_items = []
+        coalescing = {}
+        # Events with an audience_id go to every member; recipients are resolved in fan-out tasks
+        audience_rules = []
         
         for rule in matching_rules:
+            if event.event_data.get('audience_id') is not None:
+                audience_rules.append(rule.id)
+                continue
+            
             try:
                 # Extract recipient from event data
                 recipient = extract_recipient(event.event_data, rule.notification_type.value)
@@ -61,44 +156,281 @@ def process_event(event_id: int):
                     logger.warning(f"No recipient found for rule {rule.id}")
                     continue
                 
-                # Render template
-                subject, body = template_service.render_template(
-                    rule.template_id, 
-                    event.event_data
-                )
-                
-                # Create notification
-                notification = Notification(
-                    rule_id=rule.id,
-                    recipient=recipient,
-                    notification_type=rule.notification_type,
-                    subject=subject,
-                    body=body,
-                    status=NotificationStatus.PENDING,
-                    scheduled_at=datetime.utcnow(),
-                    metadata={
-                        'event_id': event.id,
+                if rule.coalesce_window_seconds:
+                    coalescing[rule.id] = rule
+                    digest_items.append({
                         'rule_id': rule.id,
-                        'event_type': event.event_type.value
-                    }
-                )
+                        'event_id': event.id,
+                        'recipient': recipient,
+                        'context': event.event_data,
+                        'buffered_at': now
+                    })
+                    continue
                 
-                db.add(notification)
-                notifications_created += 1
+                # Render template
+                with timed(STAGE_SECONDS, stage="render", event_type=event_type):
+                    subject, body = template_service.render_template(
+                        rule.template_id, 
+                        event.event_data
+                    )
+                
+                rows.append(notification_row(rule, event, recipient, subject, body, now))
                 
             except Exception as e:
                 logger.error(f"Error creating notification for rule {rule.id}: {e}")
                 continue
         
-        # Mark event as processed
-        event.processed = True
-        db.commit()
+        with timed(STAGE_SECONDS, stage="insert", event_type=event_type):
+            digest_service = DigestService(db)
+            buffered = digest_service.buffer(digest_items)
+            # Buffers that reached their rule's count threshold are flushed without waiting for the window
+            full = [
+                (rule_id, recipient) for rule_id, recipient in buffered
+                if digest_service.buffered_count(rule_id, recipient) >= digest_limit(coalescing[rule_id])
+            ]
+            # Last before commit: it locks the shared hourly rollup rows
+            inserted = insert_notifications(db, rows)
+            db.commit()
+        record_created(event_type, inserted)
         
-        logger.info(f"Event {event_id} processed, created {notifications_created} notifications")
+        # Rows are committed, so the batch workers can claim them right away
+        dispatch_by_priority(inserted)
+        for rule_id, recipient in full:
+            flush_digest.delay(rule_id, recipient)
+        for rule_id in audience_rules:
+            fan_out_audience.delay(event.id, rule_id)
+        
+        STAGE_SECONDS.labels(stage="process_event", event_type=event_type).observe(time.perf_counter() - started)
+        logger.info(
+            f"Event {event_id} processed, created {len(inserted)} notifications, "
+            f"buffered {len(buffered)} for digests"
+        )
         return True
         
     except Exception as e:
         logger.error(f"Error processing event {event_id}: {e}")
+        # Releases the claim, so the event can be processed again
+        db.rollback()
         return False
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+@celery_app.task
+def process_event(event_id: int):
+    """Process a single event and trigger notifications"""
+    return run_event(event_id)
+
+def match_batch(event_ids: list) -> Dict[int, list]:
+    """
+    Matching rules of the batch's unprocessed events, evaluated in one call so large
+    batches are spread over the rule pool processes
+    """
+    db = get_db()
+    try:
+        events = db.execute(
+            select(Event.id, Event.event_type, Event.event_data)
+            .where(Event.id.in_(event_ids), Event.processed == False)
+        ).all()
+        started = time.perf_counter()
+        matches = RulesEngine(db).get_matching_rules_batch(
+            [(event.event_type, event.event_data) for event in events]
+        )
+        if events:
+            # Spread over the batch, so the per-event histogram stays comparable
+            elapsed = (time.perf_counter() - started) / len(events)
+            for event in events:
+                STAGE_SECONDS.labels(stage="rule_match", event_type=event.event_type.value).observe(elapsed)
+        return {event.id: rules for event, rules in zip(events, matches)}
+    finally:
+        db.close()
+
+@celery_app.task(bind=True, acks_late=True, reject_on_worker_lost=True)
+def process_event_batch(self, event_ids: list):
+    """
+    Process a group of events published together by the outbox relay. The message is
+    acked once the batch is done, so a batch lost with its worker is redelivered, and
+    events that failed are retried on their own; events processed already are skipped.
+    """
+    try:
+        matches = match_batch(event_ids)
+    except Exception as e:
+        logger.error(f"Error matching rules for batch, matching per event: {e}")
+        matches = {}
+    
+    failed = [event_id for event_id in event_ids if not run_event(event_id, matches.get(event_id))]
+    
+    logger.info(f"Processed {len(event_ids) - len(failed)}/{len(event_ids)} events in batch")
+    if failed:
+        # Past the last retry, requeue_unprocessed_events publishes them again
+        raise self.retry(
+            args=(failed,), kwargs={}, countdown=settings.RETRY_BASE_DELAY, max_retries=settings.MAX_RETRY_ATTEMPTS
+        )
+    return len(event_ids)
+
+@celery_app.task(bind=True, acks_late=True)
+def fan_out_audience(self, event_id: int, rule_id: int, after_id: int = 0, next_queued: bool = False):
+    """
+    Create and dispatch one rule's notifications for the next AUDIENCE_CHUNK_SIZE members
+    of the event's audience. A full chunk queues the following one first, so chunks are
+    spread over workers while each task only holds one chunk in memory. A failed chunk is
+    retried without queueing its successor again; rows that already exist are skipped by
+    the dedup key.
+    """
+    db = get_db()
+    try:
+        event = db.get(Event, event_id)
+        rule = db.get(NotificationRule, rule_id)
+        if not event or not rule:
+            logger.error(f"Fan-out for event {event_id} rule {rule_id}: event or rule not found")
+            return 0
+        
+        audience_id = event.event_data.get('audience_id')
+        members = AudienceService(db).member_chunk(audience_id, after_id, settings.AUDIENCE_CHUNK_SIZE)
+        if len(members) == settings.AUDIENCE_CHUNK_SIZE and not next_queued:
+            fan_out_audience.delay(event_id, rule_id, members[-1].id)
+            next_queued = True
+        
+        template = TemplateService(db).get_compiled_template(rule.template_id)
+        now = datetime.utcnow()
+        rows = []
+        
+        # Evaluated over the whole chunk at once
+        in_segment = compile_segment(event.event_data.get('segment')).evaluate_many(
+            [member.attributes or {} for member in members]
+        )
+        for member, selected in zip(members, in_segment):
+            if not selected:
+                continue
+            attributes = member.attributes or {}
+            
+            context = {**event.event_data, **attributes, 'user_id': member.user_id}
+            recipient = extract_recipient(context, rule.notification_type.value)
+            if not recipient:
+                continue
+            
+            try:
+                with timed(STAGE_SECONDS, stage="render", event_type=event.event_type.value):
+                    subject, body = template.render(context)
+            except Exception as e:
+                logger.error(f"Error rendering rule {rule_id} for audience member {member.id}: {e}")
+                continue
+            rows.append(notification_row(rule, event, recipient, subject, body, now, audience=True))
+        
+        inserted = insert_notifications(db, rows)
+        db.commit()
+        record_created(event.event_type.value, inserted)
+        dispatch_by_priority(inserted)
+        
+        logger.info(
+            f"Audience {audience_id} fan-out for event {event_id} rule {rule_id}: "
+            f"{len(inserted)} notifications from {len(members)} members"
+        )
+        return len(inserted)
+        
+    except Exception as e:
+        logger.error(f"Error fanning out event {event_id} rule {rule_id} after member {after_id}: {e}")
+        db.rollback()
+        raise self.retry(
+            exc=e,
+            args=(),
+            kwargs={'event_id': event_id, 'rule_id': rule_id, 'after_id': after_id, 'next_queued': next_queued},
+            countdown=settings.RETRY_BASE_DELAY,
+            max_retries=settings.MAX_RETRY_ATTEMPTS
+        )
+    finally:
+        db.close()
+
+def render_digest(template_service: TemplateService, rule: Any, items: list) -> Optional[tuple]:
+    """
+    Subject and body of a digest. Several items fall back to the rule's own template when
+    its digest template is gone or fails to render; None when no template renders.
+    """
+    if len(items) == 1:
+        attempts = [(rule.template_id, items[0].context)]
+    else:
+        context = digest_context(items)
+        attempts = [(template_id, context) for template_id in dict.fromkeys(
+            template_id for template_id in (rule.digest_template_id, rule.template_id) if template_id
+        )]
+    for template_id, context in attempts:
+        try:
+            return template_service.render_template(template_id, context)
+        except SQLAlchemyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error rendering digest of rule {rule.id} with template {template_id}: {e}")
+    return None
+
+@celery_app.task(acks_late=True)
+def flush_digest(rule_id: int, recipient: str):
+    """
+    Merge a recipient's buffered items for a coalescing rule into one notification and
+    dispatch it. A single item is rendered with the rule's own template; several are
+    rendered with its digest template (or its own template when it has none), with the
+    buffered contexts available as `items` and their number as `digest_count`. Items
+    that no template renders are dropped.
+    """
+    db = get_db()
+    try:
+        rule = db.get(NotificationRule, rule_id)
+        if not rule:
+            logger.error(f"Digest flush for rule {rule_id}: rule not found")
+            return 0
+        
+        items = DigestService(db).take(rule_id, recipient, digest_limit(rule))
+        if not items:
+            db.rollback()
+            return 0
+        
+        event = db.execute(
+            select(Event.id, Event.event_type, Event.created_at).where(Event.id == items[0].event_id)
+        ).first()
+        if event is None:
+            # Archived while buffered: the items hold the context, and the current month's partition
+            # always exists
+            event = SimpleNamespace(id=items[0].event_id, event_type=rule.event_type, created_at=datetime.utcnow())
+        rendered = render_digest(TemplateService(db), rule, items)
+        if rendered is None:
+            # Retrying can't help, and the items would stay buffered forever
+            db.commit()
+            logger.error(f"Dropped {len(items)} digest items of rule {rule_id} to {recipient}: no template renders")
+            return 0
+        subject, body = rendered
+        
+        row = notification_row(rule, event, recipient, subject, body, datetime.utcnow())
+        row['notification_metadata']['digest_count'] = len(items)
+        inserted = insert_notifications(db, [row])
+        db.commit()
+        
+        event_type = event.event_type.value
+        record_created(event_type, inserted)
+        NOTIFICATIONS_COALESCED.labels(event_type=event_type, channel=rule.notification_type.value).inc(len(items))
+        dispatch_by_priority(inserted)
+        
+        logger.info(f"Flushed digest of {len(items)} items for rule {rule_id} to {recipient}")
+        return len(items)
+        
+    except Exception as e:
+        logger.error(f"Error flushing digest for rule {rule_id} to {recipient}: {e}")
+        # Puts the taken items back in the buffer
+        db.rollback()
+        return 0
+    finally:
+        db.close()
+
+@celery_app.task
+def flush_due_digests():
+    """Queue a flush for every digest buffer whose window has ended or that is full"""
+    db = get_db()
+    try:
+        groups = DigestService(db).due_groups()
+        for rule_id, recipient in groups:
+            flush_digest.delay(rule_id, recipient)
+        
+        if groups:
+            logger.info(f"Queued {len(groups)} digest flushes")
+        
+    except Exception as e:
+        logger.error(f"Error sweeping digest buffers: {e}")
+    finally:
+        db.close()
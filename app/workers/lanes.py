@@ -0,0 +1,62 @@
+from typing import Dict, Iterable, List, Tuple
+from app.models.models import EventType, NotificationPriority
+from app.core.config import settings
+
+NOTIFICATION_QUEUES = {
+    NotificationPriority.HIGH: "notifications_high",
+    NotificationPriority.NORMAL: "notifications",
+    NotificationPriority.BULK: "notifications_bulk",
+}
+
+EVENT_QUEUES = {
+    NotificationPriority.HIGH: "events_high",
+    NotificationPriority.NORMAL: "events",
+    NotificationPriority.BULK: "events_bulk",
+}
+
+# Event batches of at least RULES_EVAL_MIN_BATCH events, matched on the rule pool by a
+# worker of their own (scripts/run_workers.py), whatever their lane
+RULE_POOL_QUEUE = "events_rules"
+
+# Periodic jobs: the sweeper, retry release, outbox purge, stats and partition maintenance
+# use Celery's default queue, update_stats is routed to analytics
+MAINTENANCE_QUEUES = ["celery", "analytics"]
+
+def event_priority(event_type: EventType) -> NotificationPriority:
+    if event_type.value in settings.HIGH_PRIORITY_EVENT_TYPES:
+        return NotificationPriority.HIGH
+    return NotificationPriority.NORMAL
+
+def notification_priority(rule_priority: int, event_type: EventType, audience: bool = False) -> NotificationPriority:
+    """
+    Lane for a rule's notifications: latency-critical event types and high-priority
+    rules go to the high lane; audience fan-out and low-priority rules to the bulk lane
+    """
+    if event_priority(event_type) == NotificationPriority.HIGH:
+        return NotificationPriority.HIGH
+    rule_priority = rule_priority or 0
+    if rule_priority >= settings.HIGH_PRIORITY_RULE_THRESHOLD:
+        return NotificationPriority.HIGH
+    if audience or rule_priority <= settings.BULK_PRIORITY_RULE_THRESHOLD:
+        return NotificationPriority.BULK
+    return NotificationPriority.NORMAL
+
+def group_by_priority(rows: Iterable[Tuple[int, NotificationPriority]]) -> Dict[NotificationPriority, List[int]]:
+    """Group (id, priority) pairs into id lists per lane; rows without a priority are NORMAL"""
+    groups: Dict[NotificationPriority, List[int]] = {}
+    for row_id, priority in rows:
+        groups.setdefault(priority or NotificationPriority.NORMAL, []).append(row_id)
+    return groups
+
+def lane_queues(lane: str) -> List[str]:
+    """
+    Queues consumed by a lane's workers: its own and every lane above it, so high
+    priority work has dedicated workers and can also use idle normal and bulk ones
+    """
+    order = [NotificationPriority.HIGH, NotificationPriority.NORMAL, NotificationPriority.BULK]
+    position = order.index(NotificationPriority(lane))
+    return [
+        queue
+        for priority in order[:position + 1]
+        for queue in (NOTIFICATION_QUEUES[priority], EVENT_QUEUES[priority])
+    ]
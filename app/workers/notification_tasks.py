@@ -1,139 +1,416 @@
-from celery import current_task
+from celery.signals import worker_process_shutdown
 from app.workers.celery_app import celery_app
 from app.db.database import SessionLocal
-from app.models.models import Notification, NotificationStatus
-from app.services.notification_providers import NotificationServiceFactory
+from app.models.models import Notification, NotificationStatus, NotificationPriority
+from app.services.delivery_engine import DeliveryRequest, get_delivery_engine, shutdown_delivery_engine
+from app.services.stats_service import StatsService
+from app.workers.lanes import NOTIFICATION_QUEUES, group_by_priority
+from app.core.config import settings
+from app.core.metrics import DELIVERIES, DELIVERY_SECONDS, QUEUE_WAIT_SECONDS, epoch
 from sqlalchemy.orm import Session
+from sqlalchemy import select, update, case, literal, or_
 from datetime import datetime, timedelta
 import logging
-import asyncio
-from typing import Dict, Any
+import random
+import time
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
+# Tries at writing a delivered batch's outcomes before leaving it to the claim reaper
+RESULT_WRITE_ATTEMPTS = 3
+
 def get_db() -> Session:
     return SessionLocal()
 
-@celery_app.task(bind=True, max_retries=3)
-def send_notification(self, notification_id: int):
+@worker_process_shutdown.connect
+def close_delivery_engine(**kwargs):
+    shutdown_delivery_engine()
+
+def retry_delay(retry_count: int) -> float:
+    """
+    Exponential backoff for the given attempt number (1 for the first retry), with
+    equal jitter: half the delay is fixed and half random, so failed batches spread out
+    """
+    delay = settings.RETRY_BASE_DELAY * settings.RETRY_BACKOFF_FACTOR ** max(retry_count - 1, 0)
+    delay = min(delay, settings.RETRY_MAX_DELAY)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+@celery_app.task
+def send_notification(notification_id: int):
     """Send a single notification"""
-    db = get_db()
-    try:
-        notification = db.query(Notification).filter(
-            Notification.id == notification_id
-        ).first()
-        
-        if not notification:
-            logger.error(f"Notification {notification_id} not found")
-            return False
-        
-        # Update status to processing
-        notification.status = NotificationStatus.PROCESSING
-        db.commit()
-        
-        # Get notification provider
-        provider = NotificationServiceFactory.get_provider(
-            notification.notification_type.value
+    # Same claim / deliver / record path as batches, so a row is only ever in flight once
+    return send_notification_batch([notification_id]) == 1
+
+def claim_notifications(db: Session, notification_ids: Optional[List[int]] = None, limit: int = None) -> list:
+    """
+    Atomically move up to `limit` PENDING notifications to PROCESSING and return them.
+    Rows locked by another worker are skipped rather than waited on.
+    """
+    claimable = select(Notification.id).where(
+        Notification.status == NotificationStatus.PENDING
+    )
+    if notification_ids is not None:
+        claimable = claimable.where(Notification.id.in_(notification_ids))
+    else:
+        claimable = claimable.where(Notification.scheduled_at <= datetime.utcnow())
+    claimable = claimable.order_by(Notification.id).limit(
+        limit or settings.BATCH_SIZE
+    ).with_for_update(skip_locked=True)
+
+    claimed = db.execute(
+        update(Notification)
+        .where(Notification.id.in_(claimable.scalar_subquery()))
+        .values(status=NotificationStatus.PROCESSING, claimed_at=datetime.utcnow())
+        .returning(
+            Notification.id,
+            Notification.notification_type,
+            Notification.recipient,
+            Notification.subject,
+            Notification.body,
+            Notification.notification_metadata,
+            Notification.retry_count,
+            Notification.max_retries,
+            Notification.created_at,
+            Notification.scheduled_at,
+            Notification.priority
         )
-        
-        if not provider:
-            raise ValueError(f"No provider for {notification.notification_type}")
-        
-        # Send notification
-        success = asyncio.run(provider.send(
-            recipient=notification.recipient,
-            subject=notification.subject or "",
-            body=notification.body,
-            metadata=notification.metadata
-        ))
-        
-        if success:
-            notification.status = NotificationStatus.SENT
-            notification.sent_at = datetime.utcnow()
-            notification.error_message = None
-            logger.info(f"Notification {notification_id} sent successfully")
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    return claimed
+
+def release_claims(db: Session, notification_ids: List[int]) -> int:
+    """Return rows still PROCESSING under a failed claim to PENDING, for the sweeper to pick up"""
+    released = db.execute(
+        update(Notification)
+        .where(Notification.id.in_(notification_ids), Notification.status == NotificationStatus.PROCESSING)
+        .values(status=NotificationStatus.PENDING, claimed_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return released
+
+def record_delivery_results(
+    db: Session,
+    claimed: list,
+    sent_ids: List[int],
+    error_message: str,
+    deferred_ids: List[int] = (),
+    deferred_until: Optional[datetime] = None
+):
+    """
+    Write SENT / RETRYING / FAILED outcomes for a delivered batch in a single UPDATE,
+    together with the matching hourly rollup increments. RETRYING rows get a jittered
+    next_attempt_at. Deferred rows (rate limited or circuit open) go back to PENDING at
+    `deferred_until` without counting as a retry.
+    """
+    notification_ids = [row.id for row in claimed]
+    sent_at = datetime.utcnow()
+    sent_set = set(sent_ids)
+    deferred_set = set(deferred_ids)
+    next_attempts = {
+        row.id: sent_at + timedelta(seconds=retry_delay(row.retry_count + 1))
+        for row in claimed
+        if row.id not in sent_set and row.id not in deferred_set and row.retry_count + 1 < row.max_retries
+    }
+    sent = Notification.id.in_(sent_ids)
+    deferred = Notification.id.in_(deferred_ids)
+    status_type = Notification.status.type
+    db.execute(
+        update(Notification)
+        .where(Notification.id.in_(notification_ids))
+        .values(
+            status=case(
+                (sent, literal(NotificationStatus.SENT, status_type)),
+                (deferred, literal(NotificationStatus.PENDING, status_type)),
+                (Notification.retry_count + 1 >= Notification.max_retries,
+                 literal(NotificationStatus.FAILED, status_type)),
+                else_=literal(NotificationStatus.RETRYING, status_type)
+            ),
+            retry_count=case(
+                (sent | deferred, Notification.retry_count), else_=Notification.retry_count + 1
+            ),
+            sent_at=case((sent, sent_at), else_=Notification.sent_at),
+            scheduled_at=case((deferred, deferred_until), else_=Notification.scheduled_at),
+            next_attempt_at=case(next_attempts, value=Notification.id, else_=None) if next_attempts else None,
+            error_message=case(
+                (sent, None), (deferred, Notification.error_message), else_=error_message
+            )
+        )
+        .execution_options(synchronize_session=False)
+    )
+    
+    stats = StatsService(db)
+    for row in claimed:
+        if row.id in sent_set:
+            stats.record_sent(row.notification_type, row.created_at, sent_at)
+        elif row.id in deferred_set:
+            continue
         else:
-            raise Exception("Provider returned failure")
-        
-        db.commit()
-        return True
-        
+            stats.record_failed(row.notification_type, permanently=row.retry_count + 1 >= row.max_retries)
+    stats.flush()
+    db.commit()
+
+def record_queue_wait(claimed: list):
+    """Observe how long claimed rows waited between becoming due and being claimed"""
+    now = time.time()
+    for row in claimed:
+        due_at = epoch(row.scheduled_at)
+        if due_at is not None:
+            QUEUE_WAIT_SECONDS.labels(
+                channel=row.notification_type.value, priority=row.priority.value
+            ).observe(max(now - due_at, 0.0))
+
+def record_deliveries(claimed: list, results: list):
+    """Count delivery outcomes and observe end-to-end latency from the event's metadata timestamp"""
+    now = time.time()
+    for row, result in zip(claimed, results):
+        channel = row.notification_type.value
+        if result.retry_after is not None:
+            DELIVERIES.labels(channel=channel, outcome="deferred").inc()
+        elif not result.sent:
+            DELIVERIES.labels(channel=channel, outcome="failed").inc()
+        else:
+            DELIVERIES.labels(channel=channel, outcome="sent").inc()
+            metadata = row.notification_metadata or {}
+            received_at = metadata.get('event_received_at')
+            if received_at is not None:
+                DELIVERY_SECONDS.labels(
+                    event_type=metadata.get('event_type', "unknown"), channel=channel
+                ).observe(max(now - received_at, 0.0))
+
+@celery_app.task
+def send_notification_batch(notification_ids: list = None):
+    """Claim a batch of pending notifications, deliver them concurrently and record the outcomes"""
+    db = get_db()
+    claimed = []
+    delivered = False
+    try:
+        claimed = claim_notifications(db, notification_ids)
+        if not claimed:
+            return 0
+        record_queue_wait(claimed)
+
+        results = get_delivery_engine().deliver_many_sync([
+            DeliveryRequest(
+                notification_type=row.notification_type.value,
+                recipient=row.recipient,
+                subject=row.subject or "",
+                body=row.body,
+                metadata=row.notification_metadata
+            )
+            for row in claimed
+        ])
+        delivered = True
+
+        sent_ids = [row.id for row, result in zip(claimed, results) if result.sent]
+        deferred = {row.id: result.retry_after for row, result in zip(claimed, results)
+                    if result.retry_after is not None}
+        retry_after = max(deferred.values(), default=0.0)
+        deferred_until = datetime.utcnow() + timedelta(seconds=retry_after)
+        for attempt in range(1, RESULT_WRITE_ATTEMPTS + 1):
+            try:
+                record_delivery_results(
+                    db, claimed, sent_ids, "Provider returned failure",
+                    deferred_ids=list(deferred), deferred_until=deferred_until
+                )
+                break
+            except Exception as e:
+                # Typically a deadlock or a dropped connection; the messages are already sent
+                db.rollback()
+                if attempt == RESULT_WRITE_ATTEMPTS:
+                    raise
+                logger.warning(f"Error recording delivery results (attempt {attempt}), retrying: {e}")
+        record_deliveries(claimed, results)
+        if deferred:
+            # Deferred rows wait in the broker, not in a worker slot, and keep their lane
+            for priority, ids in group_by_priority(
+                (row.id, row.priority) for row in claimed if row.id in deferred
+            ).items():
+                dispatch_notifications(ids, priority, countdown=retry_after)
+
+        logger.info(f"Batch delivered {len(sent_ids)}/{len(claimed)} notifications, deferred {len(deferred)}")
+        return len(sent_ids)
+
     except Exception as e:
-        logger.error(f"Failed to send notification {notification_id}: {e}")
-        
-        # Update notification with error
-        notification = db.query(Notification).filter(
-            Notification.id == notification_id
-        ).first()
+        db.rollback()
+        if delivered:
+            # Releasing them would send the whole batch again right away
+            logger.error(
+                f"Error after delivering a batch of {len(claimed)} notifications; rows not yet recorded "
+                f"stay PROCESSING until the claim reaper requeues them: {e}"
+            )
+        elif claimed:
+            logger.error(f"Error sending notification batch: {e}")
+            try:
+                release_claims(db, [row.id for row in claimed])
+            except Exception as release_error:
+                # The claim reaper requeues them once PROCESSING_LEASE_SECONDS have passed
+                logger.error(f"Error releasing claimed notifications: {release_error}")
+                db.rollback()
+        return 0
+    finally:
+        db.close()
+
+def chunked(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def dispatch_notifications(
+    notification_ids: List[int],
+    priority: NotificationPriority = NotificationPriority.NORMAL,
+    countdown: Optional[float] = None
+):
+    """Enqueue committed notifications for delivery in BATCH_SIZE chunks on their lane's queue"""
+    for batch in chunked(notification_ids, settings.BATCH_SIZE):
+        send_notification_batch.apply_async(
+            args=[batch], queue=NOTIFICATION_QUEUES[priority], countdown=countdown
+        )
+
+def dispatch_by_priority(rows):
+    """Enqueue rows carrying `id` and `priority`, each on its own lane"""
+    for priority, notification_ids in group_by_priority((row.id, row.priority) for row in rows).items():
+        dispatch_notifications(notification_ids, priority)
+
+@celery_app.task
+def process_pending_notifications():
+    """
+    Sweep pending notifications that missed immediate dispatch.
+    Only rows due and queued (scheduled or swept) more than PENDING_SWEEP_GRACE_SECONDS
+    ago are picked up, so rows waiting behind a lane's backlog are queued again at most
+    once per grace period. The whole backlog is walked in id order one BATCH_SIZE page
+    at a time.
+    """
+    db = get_db()
+    try:
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=settings.PENDING_SWEEP_GRACE_SECONDS)
+        last_id = 0
+        queued = 0
         
-        if notification:
-            notification.retry_count += 1
-            notification.error_message = str(e)
+        while True:
+            page = db.query(Notification.id, Notification.priority).filter(
+                Notification.status == NotificationStatus.PENDING,
+                Notification.scheduled_at <= cutoff,
+                or_(Notification.swept_at.is_(None), Notification.swept_at <= cutoff),
+                Notification.id > last_id
+            ).order_by(Notification.id).limit(settings.BATCH_SIZE).all()
             
-            if notification.retry_count >= notification.max_retries:
-                notification.status = NotificationStatus.FAILED
-                logger.error(f"Notification {notification_id} failed permanently")
-            else:
-                notification.status = NotificationStatus.RETRYING
-                # Calculate backoff delay
-                delay = (2 ** notification.retry_count) * 60  # Exponential backoff
-                logger.info(f"Retrying notification {notification_id} in {delay} seconds")
-                
-                # Retry with delay
-                self.retry(countdown=delay, exc=e)
+            if not page:
+                break
             
+            db.execute(
+                update(Notification)
+                .where(Notification.id.in_([row.id for row in page]))
+                .values(swept_at=now)
+                .execution_options(synchronize_session=False)
+            )
             db.commit()
+            dispatch_by_priority(page)
+            queued += len(page)
+            last_id = page[-1].id
         
-        db.close()
-        return False
-    
+        logger.info(f"Queued {queued} pending notifications")
+        
+    except Exception as e:
+        logger.error(f"Error processing pending notifications: {e}")
+        db.rollback()
     finally:
         db.close()
 
 @celery_app.task
-def process_pending_notifications():
-    """Process all pending notifications"""
+def release_due_retries():
+    """
+    Move RETRYING notifications whose next_attempt_at has passed back to PENDING,
+    BATCH_SIZE at a time in due order, and queue each released batch for delivery
+    """
     db = get_db()
     try:
-        pending_notifications = db.query(Notification).filter(
-            Notification.status == NotificationStatus.PENDING,
-            Notification.scheduled_at <= datetime.utcnow()
-        ).limit(100).all()
+        released = 0
         
-        for notification in pending_notifications:
-            send_notification.delay(notification.id)
+        while True:
+            now = datetime.utcnow()
+            due = select(Notification.id).where(
+                Notification.status == NotificationStatus.RETRYING,
+                Notification.next_attempt_at <= now
+            ).order_by(Notification.next_attempt_at).limit(
+                settings.BATCH_SIZE
+            ).with_for_update(skip_locked=True)
+            
+            batch = db.execute(
+                update(Notification)
+                .where(Notification.id.in_(due.scalar_subquery()))
+                .values(status=NotificationStatus.PENDING, scheduled_at=now, next_attempt_at=None)
+                .returning(Notification.id, Notification.priority)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+            
+            if not batch:
+                break
+            
+            dispatch_by_priority(batch)
+            released += len(batch)
+            if len(batch) < settings.BATCH_SIZE:
+                break
         
-        logger.info(f"Queued {len(pending_notifications)} pending notifications")
+        logger.info(f"Released {released} notifications for retry")
         
     except Exception as e:
-        logger.error(f"Error processing pending notifications: {e}")
+        logger.error(f"Error releasing due retries: {e}")
+        db.rollback()
     finally:
         db.close()
 
 @celery_app.task
-def retry_failed_notifications():
-    """Retry failed notifications that haven't exceeded max retries"""
+def requeue_expired_claims():
+    """
+    Move PROCESSING notifications claimed more than PROCESSING_LEASE_SECONDS ago, whose
+    worker died mid-batch, back to PENDING and queue them for delivery
+    """
     db = get_db()
     try:
-        retry_notifications = db.query(Notification).filter(
-            Notification.status == NotificationStatus.RETRYING,
-            Notification.retry_count < Notification.max_retries
-        ).limit(50).all()
+        requeued = 0
         
-        for notification in retry_notifications:
-            send_notification.delay(notification.id)
+        while True:
+            now = datetime.utcnow()
+            expired = select(Notification.id).where(
+                Notification.status == NotificationStatus.PROCESSING,
+                Notification.claimed_at <= now - timedelta(seconds=settings.PROCESSING_LEASE_SECONDS)
+            ).order_by(Notification.claimed_at).limit(
+                settings.BATCH_SIZE
+            ).with_for_update(skip_locked=True)
+            
+            batch = db.execute(
+                update(Notification)
+                .where(Notification.id.in_(expired.scalar_subquery()))
+                .values(status=NotificationStatus.PENDING, scheduled_at=now, claimed_at=None)
+                .returning(Notification.id, Notification.priority)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+            
+            if not batch:
+                break
+            
+            dispatch_by_priority(batch)
+            requeued += len(batch)
+            if len(batch) < settings.BATCH_SIZE:
+                break
         
-        logger.info(f"Queued {len(retry_notifications)} notifications for retry")
+        if requeued:
+            logger.warning(f"Requeued {requeued} notifications with expired claims")
         
     except Exception as e:
-        logger.error(f"Error retrying failed notifications: {e}")
+        logger.error(f"Error requeuing expired claims: {e}")
+        db.rollback()
     finally:
         db.close()
 
 @celery_app.task
 def send_bulk_notifications(notification_ids: list):
     """Send multiple notifications in bulk"""
-    for notification_id in notification_ids:
-        send_notification.delay(notification_id)
+    dispatch_notifications(notification_ids, NotificationPriority.BULK)
     
     logger.info(f"Queued {len(notification_ids)} bulk notifications")
\ No newline at end of file
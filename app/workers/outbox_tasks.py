@@ -0,0 +1,167 @@
+from app.workers.celery_app import celery_app
+from app.db.database import SessionLocal
+from app.models.models import Event, EventOutbox
+from app.workers.event_tasks import process_event_batch
+from app.workers.notification_tasks import chunked
+from app.workers.lanes import EVENT_QUEUES, RULE_POOL_QUEUE, event_priority
+from app.core.config import settings
+from app.core.metrics import OUTBOX_PUBLISHED, start_exporter
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete
+from datetime import datetime, timedelta
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+def get_db() -> Session:
+    return SessionLocal()
+
+def publish_events(rows: list):
+    """
+    Publish (event_id, event_type) rows as process_event_batch messages on their events
+    lanes; groups large enough for the rule pool go to the rule pool worker instead
+    """
+    lanes = {}
+    for row in rows:
+        lanes.setdefault(event_priority(row.event_type), []).append(row.event_id)
+    for priority, event_ids in lanes.items():
+        OUTBOX_PUBLISHED.labels(priority=priority.value).inc(len(event_ids))
+        for group in chunked(event_ids, settings.EVENT_PUBLISH_GROUP_SIZE):
+            queue = RULE_POOL_QUEUE if len(group) >= settings.RULES_EVAL_MIN_BATCH else EVENT_QUEUES[priority]
+            process_event_batch.apply_async(args=[group], queue=queue)
+
+def relay_outbox(db: Session, limit: int = None) -> int:
+    """
+    Publish one batch of unpublished outbox rows as process_event_batch messages,
+    on the events lane of their event type, and mark them published. Rows are locked
+    with SKIP LOCKED, so several relays can run at once; a crash between publish and
+    commit republishes (at-least-once).
+    """
+    rows = db.execute(
+        select(EventOutbox.id, EventOutbox.event_id, Event.event_type)
+        .join(Event, Event.id == EventOutbox.event_id)
+        .where(EventOutbox.published_at.is_(None))
+        .order_by(EventOutbox.id)
+        .limit(limit or settings.OUTBOX_RELAY_BATCH_SIZE)
+        .with_for_update(of=EventOutbox, skip_locked=True)
+    ).all()
+    if not rows:
+        db.rollback()
+        return 0
+
+    publish_events(rows)
+    db.execute(
+        update(EventOutbox)
+        .where(EventOutbox.id.in_([row.id for row in rows]))
+        .values(published_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return len(rows)
+
+@celery_app.task
+def relay_event_outbox():
+    """Drain the outbox; a fallback for deployments without the dedicated relay process"""
+    db = get_db()
+    try:
+        published = 0
+        while True:
+            count = relay_outbox(db)
+            published += count
+            if count < settings.OUTBOX_RELAY_BATCH_SIZE:
+                break
+
+        if published:
+            logger.info(f"Published {published} outbox events")
+
+    except Exception as e:
+        logger.error(f"Error relaying event outbox: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+@celery_app.task
+def requeue_unprocessed_events():
+    """
+    Publish again the events whose outbox row was published more than
+    EVENT_PROCESSING_LEASE_SECONDS ago but that are still unprocessed: their batch was
+    lost with its worker, or ran out of retries. Renewing published_at republishes an
+    event at most once per lease.
+    """
+    db = get_db()
+    try:
+        requeued = 0
+        
+        while True:
+            now = datetime.utcnow()
+            rows = db.execute(
+                select(EventOutbox.id, EventOutbox.event_id, Event.event_type)
+                .join(Event, Event.id == EventOutbox.event_id)
+                .where(
+                    EventOutbox.published_at <= now - timedelta(seconds=settings.EVENT_PROCESSING_LEASE_SECONDS),
+                    Event.processed == False
+                )
+                .order_by(EventOutbox.published_at)
+                .limit(settings.OUTBOX_RELAY_BATCH_SIZE)
+                .with_for_update(of=EventOutbox, skip_locked=True)
+            ).all()
+            if not rows:
+                db.rollback()
+                break
+            
+            publish_events(rows)
+            db.execute(
+                update(EventOutbox)
+                .where(EventOutbox.id.in_([row.id for row in rows]))
+                .values(published_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            requeued += len(rows)
+            if len(rows) < settings.OUTBOX_RELAY_BATCH_SIZE:
+                break
+        
+        if requeued:
+            logger.warning(f"Republished {requeued} events left unprocessed")
+        
+    except Exception as e:
+        logger.error(f"Error requeuing unprocessed events: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+@celery_app.task
+def purge_event_outbox():
+    """Delete outbox rows published more than OUTBOX_RETENTION_HOURS ago"""
+    db = get_db()
+    try:
+        cutoff = datetime.utcnow() - timedelta(hours=settings.OUTBOX_RETENTION_HOURS)
+        result = db.execute(delete(EventOutbox).where(EventOutbox.published_at < cutoff))
+        db.commit()
+        logger.info(f"Purged {result.rowcount} published outbox rows")
+    except Exception as e:
+        logger.error(f"Error purging event outbox: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+def run_relay():
+    """Relay loop for a dedicated process: publish continuously, sleep briefly when idle"""
+    logger.info("Event outbox relay started")
+    while True:
+        db = get_db()
+        try:
+            while relay_outbox(db) >= settings.OUTBOX_RELAY_BATCH_SIZE:
+                pass
+        except Exception as e:
+            logger.error(f"Error relaying event outbox: {e}")
+            db.rollback()
+        finally:
+            db.close()
+        time.sleep(settings.OUTBOX_RELAY_POLL_INTERVAL)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=settings.LOG_LEVEL)
+    start_exporter(settings.RELAY_METRICS_PORT)
+    run_relay()
@@ -0,0 +1,284 @@
+"""
+End-to-end throughput benchmark for the notification pipeline.
+
+Runs the FastAPI app in-process against a scratch SQLite (or local Postgres)
+database, with Celery in eager mode and fake providers of configurable latency
+and error rate, then reports ingestion RPS, rule evaluation and render times,
+delivery latency percentiles and database round-trips per notification.
+
+    python -m scripts.benchmark --events 2000 --concurrency 50 --latency-ms 20 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+# Add the app directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Notification pipeline benchmark")
+    parser.add_argument("--events", type=int, default=1000, help="Events to ingest")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent ingestion requests")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="Ingest through POST /events/batch in batches of this size (0 = one event per request)")
+    parser.add_argument("--latency-ms", type=float, default=10.0, help="Fake provider send latency")
+    parser.add_argument("--jitter-ms", type=float, default=5.0, help="Uniform jitter added to the send latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake sends that fail")
+    parser.add_argument("--database-url", default=None, help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    return parser.parse_args()
+
+args = parse_args()
+random.seed(args.seed)
+
+# Settings are read at import time, so the environment is prepared before importing the app
+_scratch = None
+if not args.database_url:
+    _scratch = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
+    args.database_url = f"sqlite:///{_scratch.name}"
+os.environ["DATABASE_URL"] = args.database_url
+os.environ.setdefault("RATE_LIMIT_BACKEND", "local")
+for limit in ("EMAIL_RATE_LIMIT", "SMS_RATE_LIMIT", "PUSH_RATE_LIMIT", "WEBHOOK_RATE_LIMIT", "WEBHOOK_HOST_RATE_LIMIT"):
+    os.environ.setdefault(limit, "0")
+
+import httpx
+from sqlalchemy import event as sa_event
+from app.db.database import engine, async_engine
+from app.main import app
+from app.models.models import Base
+from app.services.notification_providers import NotificationProvider, NotificationServiceFactory
+from app.services.rules_engine import RulesEngine
+from app.services.template_service import CompiledTemplate
+from app.workers.celery_app import celery_app
+from app.workers.outbox_tasks import relay_event_outbox
+from app.core.config import settings
+from scripts.create_initial_data import create_initial_data
+
+celery_app.conf.task_always_eager = True
+
+class Recorder:
+    """Thread-safe sample and counter collection for the report"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.counters = defaultdict(int)
+
+    def sample(self, name: str, value: float):
+        with self.lock:
+            self.samples[name].append(value)
+
+    def count(self, name: str, amount: int = 1):
+        with self.lock:
+            self.counters[name] += amount
+
+recorder = Recorder()
+event_posted_at = {}
+
+class FakeProvider(NotificationProvider):
+    def __init__(self, channel: str):
+        self.channel = channel
+
+    async def send(self, recipient, subject, body, metadata=None) -> bool:
+        await asyncio.sleep(max(0.0, args.latency_ms + random.uniform(0, args.jitter_ms)) / 1000)
+        success = random.random() >= args.error_rate
+        recorder.count(f"sent.{self.channel}" if success else f"failed.{self.channel}")
+        posted_at = event_posted_at.get((metadata or {}).get("event_id"))
+        if success and posted_at is not None:
+            recorder.sample("delivery_latency", time.time() - posted_at)
+        return success
+
+NotificationServiceFactory._create_providers = staticmethod(
+    lambda: {channel: FakeProvider(channel) for channel in ("email", "sms", "push", "webhook")}
+)
+
+def timed(name, function):
+    def wrapper(*wrapped_args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(*wrapped_args, **kwargs)
+        finally:
+            recorder.sample(name, time.perf_counter() - started)
+    return wrapper
+
+def timed_per_event(name, function):
+    """Time a batch call and record its share for each event, so batches and single events compare"""
+    def wrapper(self, events, *wrapped_args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return function(self, events, *wrapped_args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            for _ in events:
+                recorder.sample(name, elapsed / len(events))
+    return wrapper
+
+# process_event_batch matches a whole group at once; process_event matches one event
+RulesEngine.get_matching_rules = timed("rule_evaluation", RulesEngine.get_matching_rules)
+RulesEngine.get_matching_rules_batch = timed_per_event("rule_evaluation", RulesEngine.get_matching_rules_batch)
+CompiledTemplate.render = timed("template_render", CompiledTemplate.render)
+
+def count_statements(target, counter: str):
+    @sa_event.listens_for(target, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        recorder.count(counter)
+
+count_statements(engine, "statements.worker")
+count_statements(async_engine.sync_engine, "statements.api")
+
+def synthetic_event(index: int) -> dict:
+    """Event mix modeled on the rules and templates of scripts/create_initial_data.py"""
+    user = {
+        "user_name": f"User {index}",
+        "email": f"user{index}@example.com",
+        "phone": f"+1555{index:07d}",
+    }
+    roll = random.random()
+    if roll < 0.5:
+        return {"event_type": "user_signup", "user_id": str(index),
+                "event_data": {**user, "send_sms": random.random() < 0.3}}
+    if roll < 0.9:
+        return {"event_type": "order_placed", "user_id": str(index),
+                "event_data": {**user, "order_id": f"ORD-{index}", "amount": round(random.uniform(5, 300), 2)}}
+    # No rules match these; they measure the cost of a miss
+    return {"event_type": "user_login", "user_id": str(index), "event_data": user}
+
+async def ingest(events: list) -> float:
+    """Post every event through the in-process ASGI app and return the elapsed seconds"""
+    semaphore = asyncio.Semaphore(args.concurrency)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def post(path: str, payload, count: int):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(f"{settings.API_V1_STR}/events/{path}", json=payload)
+                recorder.sample("ingest_request", time.perf_counter() - started)
+                if response.status_code != 200:
+                    recorder.count("ingest_errors", count)
+                    return
+                posted_at = time.time()
+                body = response.json()
+                ids = [item["id"] for item in body["items"] if item["id"]] if path == "batch" else [body["id"]]
+                for event_id in ids:
+                    event_posted_at[event_id] = posted_at
+
+        started = time.perf_counter()
+        if args.batch_size:
+            await asyncio.gather(*(
+                post("batch", events[start:start + args.batch_size], len(events[start:start + args.batch_size]))
+                for start in range(0, len(events), args.batch_size)
+            ))
+        else:
+            await asyncio.gather(*(post("", payload, 1) for payload in events))
+        return time.perf_counter() - started
+
+def run_relay(stop: threading.Event):
+    """Stand-in for the outbox relay process; eager Celery runs the whole pipeline inline"""
+    while not stop.is_set():
+        relay_event_outbox()
+        stop.wait(settings.OUTBOX_RELAY_POLL_INTERVAL)
+    relay_event_outbox()
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(name: str, scale: float = 1000.0) -> dict:
+    values = recorder.samples.get(name, [])
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values) * scale if values else 0.0,
+        "p50": percentile(values, 0.50) * scale,
+        "p95": percentile(values, 0.95) * scale,
+        "p99": percentile(values, 0.99) * scale,
+        "max": max(values) * scale if values else 0.0,
+    }
+
+def build_report(ingest_seconds: float, total_seconds: float) -> dict:
+    sent = sum(value for key, value in recorder.counters.items() if key.startswith("sent."))
+    failed = sum(value for key, value in recorder.counters.items() if key.startswith("failed."))
+    attempts = sent + failed
+    return {
+        "config": {
+            "events": args.events, "concurrency": args.concurrency, "batch_size": args.batch_size,
+            "latency_ms": args.latency_ms, "jitter_ms": args.jitter_ms, "error_rate": args.error_rate,
+            "database": engine.dialect.name,
+        },
+        "ingestion": {
+            "seconds": ingest_seconds,
+            "events_per_second": args.events / ingest_seconds if ingest_seconds else 0.0,
+            "errors": recorder.counters["ingest_errors"],
+            "request_ms": summarize("ingest_request"),
+            "db_statements_per_event": recorder.counters["statements.api"] / args.events,
+        },
+        "pipeline": {
+            "seconds": total_seconds,
+            "notifications_sent": sent,
+            "send_failures": failed,
+            "notifications_per_second": sent / total_seconds if total_seconds else 0.0,
+            "rule_evaluation_ms": summarize("rule_evaluation"),
+            "template_render_ms": summarize("template_render"),
+            "delivery_latency_ms": summarize("delivery_latency"),
+            "db_statements_per_notification": recorder.counters["statements.worker"] / attempts if attempts else 0.0,
+        },
+    }
+
+def print_report(report: dict):
+    config, ingestion, pipeline = report["config"], report["ingestion"], report["pipeline"]
+    print(f"\n📊 Benchmark: {config['events']} events, concurrency {config['concurrency']}, "
+          f"provider {config['latency_ms']}ms ±{config['jitter_ms']}ms, error rate {config['error_rate']:.1%} "
+          f"({config['database']})")
+    print(f"\nIngestion: {ingestion['events_per_second']:.0f} events/s over {ingestion['seconds']:.2f}s, "
+          f"{ingestion['errors']} errors, {ingestion['db_statements_per_event']:.1f} DB statements/event")
+    print(f"Pipeline:  {pipeline['notifications_per_second']:.0f} notifications/s, "
+          f"{pipeline['notifications_sent']} sent, {pipeline['send_failures']} failed sends, "
+          f"{pipeline['db_statements_per_notification']:.1f} DB statements/notification")
+    print(f"\n{'stage (ms)':<22}{'count':>8}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}")
+    for label, key, section in (
+        ("ingest request", "request_ms", ingestion),
+        ("rule evaluation", "rule_evaluation_ms", pipeline),
+        ("template render", "template_render_ms", pipeline),
+        ("delivery latency", "delivery_latency_ms", pipeline),
+    ):
+        stats = section[key]
+        print(f"{label:<22}{stats['count']:>8}{stats['mean']:>10.2f}{stats['p50']:>10.2f}"
+              f"{stats['p95']:>10.2f}{stats['p99']:>10.2f}{stats['max']:>10.2f}")
+
+def main():
+    Base.metadata.create_all(engine)
+    create_initial_data()
+    events = [synthetic_event(index) for index in range(args.events)]
+
+    stop = threading.Event()
+    relay = threading.Thread(target=run_relay, args=(stop,), name="benchmark-relay")
+    started = time.perf_counter()
+    relay.start()
+    ingest_seconds = asyncio.run(ingest(events))
+    stop.set()
+    relay.join()
+    total_seconds = time.perf_counter() - started
+
+    report = build_report(ingest_seconds, total_seconds)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    if _scratch is not None:
+        engine.dispose()
+        os.unlink(_scratch.name)
+
+if __name__ == "__main__":
+    main()
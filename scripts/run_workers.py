@@ -0,0 +1,64 @@
+from app.core.config import settings
+from app.workers.lanes import MAINTENANCE_QUEUES, RULE_POOL_QUEUE, lane_queues
+import shutil
+import subprocess
+import sys
+import os
+
+def lane_concurrency() -> dict:
+    """Split WORKER_CONCURRENCY across lanes by WORKER_LANE_WEIGHTS, at least one process per lane"""
+    weights = {lane: weight for lane, weight in settings.WORKER_LANE_WEIGHTS.items() if weight > 0}
+    total = sum(weights.values())
+    return {
+        lane: max(1, round(settings.WORKER_CONCURRENCY * weight / total))
+        for lane, weight in weights.items()
+    }
+
+def metrics_dir(name: str) -> str:
+    """
+    Fresh PROMETHEUS_MULTIPROC_DIR of one worker: its exporter aggregates the samples of
+    its own pool processes only, so scraping every worker counts each sample once
+    """
+    path = os.path.join(settings.WORKER_METRICS_DIR, name)
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    return path
+
+def run_workers():
+    """
+    Start one prefork Celery worker per priority lane, and one threaded worker whose
+    process runs the multi-process rule pool for large event batches, and wait for them
+    """
+    workers = []
+    lanes = lane_concurrency()
+    # The lowest priority lane consumes the most queues; it also runs the periodic jobs,
+    # so they never hold up urgent work
+    lowest = max(lanes, key=lambda lane: len(lane_queues(lane)))
+    specs = [
+        (lane, "prefork", concurrency, lane_queues(lane) + (MAINTENANCE_QUEUES if lane == lowest else []))
+        for lane, concurrency in lanes.items()
+    ]
+    # Prefork children can't start processes, so the rule pool needs a worker of its own
+    specs.append(("rules", "threads", settings.RULE_POOL_WORKER_THREADS, [RULE_POOL_QUEUE]))
+    for name, pool, concurrency, queues in specs:
+        # One metrics exporter port and sample directory per worker
+        env = {**os.environ, "WORKER_METRICS_PORT": "0"}
+        if settings.WORKER_METRICS_PORT:
+            env["WORKER_METRICS_PORT"] = str(settings.WORKER_METRICS_PORT + len(workers))
+            env["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir(name)
+        print(f"🚀 Starting {name} worker: {concurrency} {pool} slots on {','.join(queues)}")
+        workers.append(subprocess.Popen([
+            sys.executable, "-m", "celery", "-A", "app.workers.celery_app", "worker",
+            "-Q", ",".join(queues), "-c", str(concurrency), "-P", pool,
+            "-n", f"{name}@%h", "--loglevel", settings.LOG_LEVEL
+        ], env=env))
+    
+    try:
+        for worker in workers:
+            worker.wait()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+if __name__ == "__main__":
+    run_workers()
@@ -0,0 +1,246 @@
+"""
+Digest buffering and flushing of coalescing rules, against a SQLite database built
+from the models: items are buffered per recipient, flushed when the buffer is full or
+the window ended, and each item ends up in exactly one notification.
+"""
+from datetime import datetime, timedelta
+from threading import Thread
+
+import pytest
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+from app.models.models import (
+    Base, Event, EventType, Notification, NotificationRule, NotificationTemplate, NotificationType
+)
+from app.services.digest_service import DigestService
+from app.services import template_service
+from app.services.rules_engine import invalidate_rule_cache
+from app.services.template_service import TemplateCache
+from app.workers import event_tasks
+
+RECIPIENT = "user@example.com"
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'digests.db'}", connect_args={"timeout": 30})
+
+    # Take the write lock when a transaction starts, so concurrent flushes queue up
+    # instead of failing to upgrade a read lock
+    @event.listens_for(engine, "connect")
+    def disable_implicit_begin(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    Base.metadata.create_all(engine)
+    factory = sessionmaker(bind=engine, autoflush=False)
+    monkeypatch.setattr(event_tasks, "SessionLocal", factory)
+    # Template ids start over in every database
+    monkeypatch.setattr(template_service, "template_cache", TemplateCache(100))
+    invalidate_rule_cache()
+    yield factory
+    invalidate_rule_cache()
+    engine.dispose()
+
+
+@pytest.fixture
+def db(session_factory):
+    db = session_factory()
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def flushes(monkeypatch):
+    """Flushes queued by event processing, and notifications dispatched to the batch workers"""
+    queued = []
+    monkeypatch.setattr(event_tasks.flush_digest, "delay", lambda *args: queued.append(args))
+    monkeypatch.setattr(event_tasks, "dispatch_by_priority", lambda rows: None)
+    return queued
+
+
+def create_rule(
+    db,
+    window: int = 3600,
+    max_count: int = None,
+    body: str = "Order {{ n }}",
+    digest_body: str = "{% for item in items %}{{ item.n }};{% endfor %}"
+) -> int:
+    template = NotificationTemplate(
+        name="order", notification_type=NotificationType.EMAIL, subject="Order {{ n }}", body=body
+    )
+    digest = NotificationTemplate(
+        name="order digest", notification_type=NotificationType.EMAIL, subject="{{ digest_count }} orders",
+        body=digest_body
+    )
+    db.add_all([template, digest])
+    db.flush()
+    rule = NotificationRule(
+        name="orders", event_type=EventType.CUSTOM, notification_type=NotificationType.EMAIL,
+        template_id=template.id, digest_template_id=digest.id,
+        coalesce_window_seconds=window, coalesce_max_count=max_count
+    )
+    db.add(rule)
+    db.flush()
+    rule_id = rule.id
+    db.commit()
+    return rule_id
+
+
+def buffer_items(db, rule_id: int, count: int, buffered_at: datetime = None) -> list:
+    events = [Event(event_type=EventType.CUSTOM, event_data={"n": n}) for n in range(count)]
+    db.add_all(events)
+    db.flush()
+    event_ids = [item.id for item in events]
+    groups = DigestService(db).buffer([
+        {
+            'rule_id': rule_id,
+            'event_id': item.id,
+            'recipient': RECIPIENT,
+            'context': item.event_data,
+            'buffered_at': buffered_at or datetime.utcnow()
+        }
+        for item in events
+    ])
+    db.commit()
+    assert groups == [(rule_id, RECIPIENT)]
+    return event_ids
+
+
+def notifications(db) -> list:
+    rows = db.execute(
+        select(Notification.event_id, Notification.subject, Notification.body, Notification.notification_metadata)
+        .order_by(Notification.id)
+    ).all()
+    # Every transaction holds the write lock, so none is left open for the tasks to wait on
+    db.rollback()
+    return rows
+
+
+def buffered(db, rule_id: int) -> int:
+    count = DigestService(db).buffered_count(rule_id, RECIPIENT)
+    db.rollback()
+    return count
+
+
+def test_flush_merges_buffer_into_one_notification(db, flushes):
+    rule_id = create_rule(db)
+    event_ids = buffer_items(db, rule_id, 5)
+
+    assert event_tasks.flush_digest(rule_id, RECIPIENT) == 5
+
+    [notification] = notifications(db)
+    assert notification.notification_metadata["digest_count"] == 5
+    assert notification.event_id == event_ids[0]
+    assert notification.subject == "5 orders"
+    assert notification.body == "0;1;2;3;4;"
+    assert buffered(db, rule_id) == 0
+    # Nothing left to flush
+    assert event_tasks.flush_digest(rule_id, RECIPIENT) == 0
+    assert len(notifications(db)) == 1
+
+
+def test_single_item_uses_rule_template(db, flushes):
+    rule_id = create_rule(db)
+    buffer_items(db, rule_id, 1)
+
+    assert event_tasks.flush_digest(rule_id, RECIPIENT) == 1
+
+    [notification] = notifications(db)
+    assert notification.subject == "Order 0"
+    assert notification.notification_metadata["digest_count"] == 1
+
+
+def test_full_buffer_is_flushed_before_window(db, flushes):
+    rule_id = create_rule(db, max_count=3)
+    events = [
+        Event(event_type=EventType.CUSTOM, event_data={"n": n, "email": RECIPIENT}) for n in range(4)
+    ]
+    db.add_all(events)
+    db.flush()
+    event_ids = [item.id for item in events]
+    db.commit()
+
+    for event_id in event_ids[:2]:
+        assert event_tasks.run_event(event_id)
+    assert flushes == []
+    assert event_tasks.run_event(event_ids[2])
+    assert flushes == [(rule_id, RECIPIENT)]
+
+    # A flush takes at most the rule's count; later items wait for the next one
+    assert event_tasks.run_event(event_ids[3])
+    assert event_tasks.flush_digest(rule_id, RECIPIENT) == 3
+    assert [n.notification_metadata["digest_count"] for n in notifications(db)] == [3]
+    assert buffered(db, rule_id) == 1
+
+
+def test_due_groups_after_window(db, flushes):
+    fresh = create_rule(db, window=60)
+    expired = create_rule(db, window=60)
+    full = create_rule(db, window=60, max_count=2)
+    buffer_items(db, fresh, 1)
+    buffer_items(db, expired, 1, buffered_at=datetime.utcnow() - timedelta(seconds=120))
+    buffer_items(db, full, 2)
+
+    assert DigestService(db).due_groups() == [(expired, RECIPIENT), (full, RECIPIENT)]
+    db.rollback()
+
+    event_tasks.flush_due_digests()
+    assert sorted(flushes) == [(expired, RECIPIENT), (full, RECIPIENT)]
+
+
+def test_concurrent_flushes_take_each_item_once(db, flushes):
+    rule_id = create_rule(db, max_count=3)
+    buffer_items(db, rule_id, 9)
+
+    workers = [Thread(target=event_tasks.flush_digest, args=(rule_id, RECIPIENT)) for _ in range(5)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    digests = notifications(db)
+    assert [n.notification_metadata["digest_count"] for n in digests] == [3, 3, 3]
+    items = [item for n in digests for item in n.body.split(";") if item]
+    assert sorted(items, key=int) == [str(n) for n in range(9)]
+    assert buffered(db, rule_id) == 0
+
+
+def test_flush_after_event_archived(db, flushes):
+    rule_id = create_rule(db)
+    event_ids = buffer_items(db, rule_id, 2)
+    db.query(Event).delete()
+    db.commit()
+
+    assert event_tasks.flush_digest(rule_id, RECIPIENT) == 2
+
+    [notification] = notifications(db)
+    assert notification.event_id == event_ids[0]
+    assert notification.notification_metadata["digest_count"] == 2
+    assert buffered(db, rule_id) == 0
+
+
+def test_broken_digest_template_falls_back_to_rule_template(db, flushes):
+    rule_id = create_rule(db, digest_body="{{ items | no_such_filter }}")
+    buffer_items(db, rule_id, 3)
+
+    assert event_tasks.flush_digest(rule_id, RECIPIENT) == 3
+
+    [notification] = notifications(db)
+    assert notification.body == "Order 2"
+    assert notification.notification_metadata["digest_count"] == 3
+    assert buffered(db, rule_id) == 0
+
+
+def test_unrenderable_items_are_dropped(db, flushes):
+    rule_id = create_rule(db, body="{{ n | no_such_filter }}", digest_body="{{ items | no_such_filter }}")
+    buffer_items(db, rule_id, 3)
+
+    assert event_tasks.flush_digest(rule_id, RECIPIENT) == 0
+
+    assert notifications(db) == []
+    # Not put back, so the sweep doesn't fail on them forever
+    assert buffered(db, rule_id) == 0
@@ -0,0 +1,118 @@
+"""
+Query-plan regression checks for the hot queries.
+
+Runs against an in-memory SQLite schema built from the models by default, or
+against Postgres when QUERY_PLAN_DATABASE_URL points at a scratch database
+(sequential scans are disabled there, so a Seq Scan means no usable index).
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event, select, func, or_
+from app.models.models import Base, Notification, NotificationRule, NotificationHourlyStats, NotificationStatus, EventType, Event, EventOutbox, AudienceMember, DigestItem
+
+DATABASE_URL = os.environ.get("QUERY_PLAN_DATABASE_URL", "sqlite://")
+
+now = datetime.utcnow()
+day_start = datetime.combine(now.date(), datetime.min.time())
+day_end = day_start + timedelta(days=1)
+
+HOT_QUERIES = {
+    "pending sweeper page": select(Notification.id).where(
+        Notification.status == NotificationStatus.PENDING,
+        Notification.scheduled_at <= now,
+        or_(Notification.swept_at.is_(None), Notification.swept_at <= now),
+        Notification.id > 0
+    ).order_by(Notification.id).limit(100),
+    "batch claim": select(Notification.id).where(
+        Notification.status == NotificationStatus.PENDING,
+        Notification.scheduled_at <= now
+    ).order_by(Notification.id).limit(100),
+    "retry release": select(Notification.id).where(
+        Notification.status == NotificationStatus.RETRYING,
+        Notification.next_attempt_at <= now
+    ).order_by(Notification.next_attempt_at).limit(100),
+    "expired claim reaper": select(Notification.id).where(
+        Notification.status == NotificationStatus.PROCESSING,
+        Notification.claimed_at <= now
+    ).order_by(Notification.claimed_at).limit(100),
+    "dashboard total": select(func.count()).select_from(Notification).where(
+        Notification.created_at >= day_start,
+        Notification.created_at < day_end
+    ),
+    "dashboard by status": select(func.count()).select_from(Notification).where(
+        Notification.created_at >= day_start,
+        Notification.created_at < day_end,
+        Notification.status == NotificationStatus.SENT
+    ),
+    "dashboard by type": select(Notification.notification_type, func.count()).where(
+        Notification.created_at >= day_start,
+        Notification.created_at < day_end
+    ).group_by(Notification.notification_type),
+    "dashboard rollups": select(NotificationHourlyStats).where(
+        NotificationHourlyStats.hour >= day_start,
+        NotificationHourlyStats.hour < day_end
+    ).order_by(NotificationHourlyStats.hour),
+    "outbox relay": select(EventOutbox.id, EventOutbox.event_id, Event.event_type).join(
+        Event, Event.id == EventOutbox.event_id
+    ).where(
+        EventOutbox.published_at.is_(None)
+    ).order_by(EventOutbox.id).limit(1000),
+    "unprocessed event requeue": select(EventOutbox.id, EventOutbox.event_id, Event.event_type).join(
+        Event, Event.id == EventOutbox.event_id
+    ).where(
+        EventOutbox.published_at <= now,
+        Event.processed == False
+    ).order_by(EventOutbox.published_at).limit(1000),
+    "audience member chunk": select(AudienceMember.id, AudienceMember.user_id, AudienceMember.attributes).where(
+        AudienceMember.audience_id == 1,
+        AudienceMember.id > 0
+    ).order_by(AudienceMember.id).limit(1000),
+    "digest buffer take": select(DigestItem.id).where(
+        DigestItem.rule_id == 1,
+        DigestItem.recipient == "user@example.com"
+    ).order_by(DigestItem.id).limit(100),
+    "active rules for event type": select(NotificationRule).where(
+        NotificationRule.event_type == EventType.ORDER_PLACED,
+        NotificationRule.is_active == True
+    ).order_by(NotificationRule.priority.desc()),
+}
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine(DATABASE_URL)
+    Base.metadata.create_all(engine)
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+
+    @event.listens_for(engine, "before_cursor_execute", retval=True)
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("explain"):
+            statement = prefix + statement
+        return statement, parameters
+
+    yield engine
+    if engine.dialect.name != "sqlite":
+        Base.metadata.drop_all(engine)
+    engine.dispose()
+
+def query_plan(engine, query) -> str:
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        conn.info["explain"] = True
+        try:
+            rows = conn.execute(query).all()
+        finally:
+            conn.info["explain"] = False
+    return "\n".join(str(row[-1]) for row in rows)
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(engine, name):
+    plan = query_plan(engine, HOT_QUERIES[name])
+    if engine.dialect.name == "sqlite":
+        table_lines = [line for line in plan.splitlines() if line.startswith(("SCAN", "SEARCH"))]
+        assert table_lines, plan
+        assert all(line.startswith("SEARCH") for line in table_lines), f"{name} falls back to a scan:\n{plan}"
+    else:
+        assert "Seq Scan" not in plan, f"{name} falls back to a sequential scan:\n{plan}"
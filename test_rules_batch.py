@@ -0,0 +1,192 @@
+"""
+Batch rule matching must return exactly what matching each event serially returns,
+whether conditions run per event, column by column, or on the rule pool processes.
+"""
+import random
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from app.core.config import settings
+from app.models.models import EventType, NotificationRule, NotificationType
+from app.services.conditions import compile_conditions
+from app.services import rules_engine
+from app.services.rules_engine import RuleIndex, RulePool, RulesEngine
+
+NAN = float("nan")
+FIELDS = ["country", "plan", "amount", "tags", "source", "user.tier", "items.0.sku", "a.b"]
+VALUES = {
+    "country": ["US", "DE", "FR", "BR", 1, True, None],
+    "plan": ["free", "pro", "team", ["pro"]],
+    "amount": [0, 5, 10.5, 99, "12", "n/a", NAN, 10 ** 400, True, float("inf")],
+    "tags": ["vip beta", "beta", "", ["vip"]],
+    "source": ["web", "ios", "android", {"nested": True}],
+    "user.tier": ["gold", "silver", 3],
+    "items.0.sku": ["A-1", "B-2", 7],
+    "a.b": ["dotted", "nested"],
+}
+OPERATORS = [
+    "equals", "not_equals", "greater_than", "less_than", "greater_or_equal", "less_or_equal",
+    "between", "contains", "regex", "in_list", "not_in_list", "exists", "not_exists", "unknown",
+]
+
+
+def random_value(rng: random.Random, field: str):
+    value = rng.choice(VALUES[field])
+    # Fresh NaN objects as well, since `in` short-circuits on identity
+    return float("nan") if value is NAN and rng.random() < 0.5 else value
+
+
+def random_condition(rng: random.Random) -> tuple:
+    operator = rng.choice(OPERATORS)
+    field = rng.choice(FIELDS)
+    if operator in ("greater_than", "less_than", "greater_or_equal", "less_or_equal"):
+        value = rng.choice([0, 5, 10.5, 50, "10", "bad"])
+    elif operator == "between":
+        value = rng.choice([[0, 10], [5, 100], [10.5, 10.5], "12", [1]])
+    elif operator in ("in_list", "not_in_list"):
+        value = rng.choice([[random_value(rng, field) for _ in range(rng.randint(1, 3))], "pro team"])
+    elif operator == "contains":
+        value = rng.choice(["vip", "beta", "o", 1])
+    elif operator == "regex":
+        value = rng.choice(["^v", "e.a$", "[0-9]+", "("])
+    else:
+        value = random_value(rng, field)
+    return field, {"operator": operator, "value": value}
+
+
+def random_conditions(rng: random.Random, depth: int = 0) -> dict:
+    conditions = dict(random_condition(rng) for _ in range(rng.randint(0, 3)))
+    if depth < 2 and rng.random() < 0.4:
+        group = rng.choice(["all", "any", "not"])
+        if group == "not":
+            conditions["not"] = random_conditions(rng, depth + 1)
+        else:
+            conditions[group] = [random_conditions(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    return conditions
+
+
+def random_rules(rng: random.Random, count: int) -> list:
+    rules = []
+    for rule_id in range(1, count + 1):
+        rules.append(NotificationRule(
+            id=rule_id,
+            name=f"rule {rule_id}",
+            event_type=rng.choice([EventType.CUSTOM, EventType.ORDER_PLACED]),
+            notification_type=rng.choice(list(NotificationType)),
+            template_id=1,
+            priority=rng.randint(1, 10),
+            conditions=random_conditions(rng) or rng.choice([None, {}, "invalid"])
+        ))
+    return rules
+
+
+def nest(data: dict, path: str, value):
+    """Store a value under a dotted path, as nested objects (lists for numeric keys)"""
+    head, _, rest = path.partition(".")
+    if not rest:
+        data[head] = value
+    elif rest.split(".")[0].isdecimal():
+        data[head] = [nest({}, rest.partition(".")[2], value)]
+    else:
+        nest(data.setdefault(head, {}), rest, value)
+    return data
+
+
+def random_events(rng: random.Random, count: int) -> list:
+    events = []
+    for _ in range(count):
+        data = {}
+        for field in rng.sample(FIELDS, k=rng.randint(0, len(FIELDS))):
+            if "." in field and rng.random() < 0.3:
+                # A literal dotted key takes precedence over the nested path
+                data[field] = random_value(rng, field)
+            else:
+                nest(data, field, random_value(rng, field))
+        events.append((rng.choice([EventType.CUSTOM, EventType.ORDER_PLACED, EventType.USER_SIGNUP]), data))
+    return events
+
+
+def serial_ids(index: RuleIndex, events: list) -> list:
+    return [[rule.id for rule in index.match(event_type, data)] for event_type, data in events]
+
+
+def batch_ids(batch: list) -> list:
+    return [[rule.id for rule in rules] for rules in batch]
+
+
+@pytest.fixture(scope="module")
+def workload():
+    rng = random.Random(2024)
+    rules = random_rules(rng, 200)
+    return rules, RuleIndex(rules), random_events(rng, 2000)
+
+
+def test_index_matches_full_conditions(workload):
+    rules, index, events = workload
+    engine = RulesEngine(db=None)
+    expected = [
+        [rule.id for rule in rules if rule.event_type == event_type and engine.evaluate_conditions(rule.conditions, data)]
+        for event_type, data in events
+    ]
+    assert serial_ids(index, events) == expected
+
+
+def test_columnar_batch_matches_serial(workload):
+    _, index, events = workload
+    assert len(events) >= settings.RULES_VECTORIZE_MIN_BATCH
+    assert batch_ids(index.match_many(events)) == serial_ids(index, events)
+
+
+def test_pool_batch_matches_serial(workload):
+    _, index, events = workload
+    pool = RulePool(index, processes=2)
+    try:
+        batch = pool.match_many(events, chunk_size=300)
+        # Default chunking spreads a batch over every process
+        assert batch_ids(pool.match_many(events[:settings.RULES_EVAL_MIN_BATCH])) == serial_ids(
+            index, events[:settings.RULES_EVAL_MIN_BATCH]
+        )
+    finally:
+        pool.shutdown()
+    assert len(batch) == len(events)
+    assert batch_ids(batch) == serial_ids(index, events)
+    # Results are the parent's compiled rules, not copies from the pool processes
+    assert all(rule is index.by_id[rule.id] for rules in batch for rule in rules)
+
+
+def test_broken_pool_is_replaced(workload, monkeypatch):
+    _, index, events = workload
+    events = events[:settings.RULES_EVAL_MIN_BATCH]
+    engine = RulesEngine(db=None)
+    monkeypatch.setattr(engine, "get_rule_index", lambda: index)
+    monkeypatch.setattr(rules_engine, "rule_pool_processes", lambda: 2)
+    pool = rules_engine.get_rule_pool(index)
+    try:
+        def broken(*args, **kwargs):
+            raise BrokenProcessPool("a pool process was killed")
+        monkeypatch.setattr(pool, "match_many", broken)
+        # Matched inline instead, and the next batch gets a new pool
+        assert batch_ids(engine.get_matching_rules_batch(events)) == serial_ids(index, events)
+        assert rules_engine._rule_pool is None
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.parametrize("conditions, data, expected", [
+    ({"amount": {"operator": "greater_than", "value": 10}}, {}, False),
+    ({"amount": {"operator": "not_equals", "value": 10}}, {}, False),
+    ({"amount": {"operator": "exists"}}, {}, False),
+    ({"amount": {"operator": "not_exists"}}, {}, True),
+    ({"not": {"amount": {"operator": "equals", "value": 10}}}, {}, True),
+    ({"user.address.city": {"operator": "equals", "value": "Oslo"}}, {"user": {"address": {"city": "Oslo"}}}, True),
+    ({"items.1.sku": {"operator": "regex", "value": "^B-"}}, {"items": [{"sku": "A-1"}, {"sku": "B-2"}]}, True),
+    ({"amount": {"operator": "between", "value": [10, 20]}}, {"amount": "20"}, True),
+    ({"any": [{"plan": {"operator": "equals", "value": "pro"}}, {"seats": {"operator": "greater_or_equal", "value": 5}}]},
+     {"plan": "free", "seats": 5}, True),
+    ({"amount": {"operator": "greater_than", "value": "bad"}}, {"amount": 1}, False),
+    ({"amount": {"operator": "unknown"}}, {}, True),
+])
+def test_condition_semantics(conditions, data, expected):
+    condition = compile_conditions(conditions)
+    assert condition.predicate(data) is expected
+    assert condition.evaluate_many([data, data]).tolist() == [expected, expected]